@@ -1,14 +1,22 @@
 
 from distutils.core import setup
+from os.path import dirname, join
+import re
+
+# the version is defined once, in the package (it is part of the key for the
+# format cache), and read from there without importing the package.
+with open(join(dirname(__file__) or '.', 'src', 'simpledate', 'utils.py')) as source:
+    VERSION = re.search(r"^VERSION = u'([^']+)'", source.read(), re.M).group(1)
 
 setup(
     name = 'simple-date',
     url = 'https://github.com/andrewcooke/simple-date',
     requires = ['pytz', 'tzlocal'],
     install_requires = ['pytz', 'tzlocal'],
+    extras_require = {'numpy': ['numpy']},
     packages = ['simpledate'],
     package_dir = {'': 'src'},
-    version = '0.4.7',
+    version = VERSION,
     description = 'Simple dates (and times, and timezones).',
     author = 'Andrew Cooke',
     author_email = 'andrew@acooke.org',
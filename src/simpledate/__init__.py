@@ -1,15 +1,19 @@
 
 from __future__ import division
+from array import array
+from bisect import bisect_right
 from calendar import timegm
 import datetime as dt
-from itertools import islice
-from collections import OrderedDict
+from itertools import islice, chain
+from collections import OrderedDict, defaultdict
 from threading import local
 from tzlocal import get_localzone
-from pytz import timezone, country_timezones, all_timezones, FixedOffset, utc, NonExistentTimeError, common_timezones, UTC
-from simpledate.fmt import strptime, reconstruct, strip, invert, auto_invert
-from simpledate.utils import DebugLog, MRUSortedIterable, OrderedSet, set_kargs_only, always_tuple
-from itertools import imap
+from pytz import timezone, country_timezones, all_timezones, FixedOffset, utc, NonExistentTimeError, AmbiguousTimeError, InvalidTimeError, common_timezones, UTC
+from pytz.tzinfo import StaticTzInfo, DstTzInfo
+from simpledate.fmt import strptime, strip, invert, auto_invert, matches, ShapeIndex, register_fast_path, formatter
+from simpledate.fast import iso_8601, rfc_2822
+from simpledate.utils import DebugLog, MRUSortedIterable, OrderedSet, IntervalCache, LazyInstance, NamedOffset, set_kargs_only, always_tuple
+from itertools import imap, izip
 
 
 # A wrapper around the datetime, pytz and tzlocal packages.
@@ -27,6 +31,10 @@ MDY = (u'(m!/d!/)?Y(! H!:M(!:S(.f)?)?)?(! !Z|! ?!z)?',)
 DMY = (u'(d!/m!/)?Y(! H!:M(!:S(.f)?)?)?(! !Z|! ?!z)?',)
 ASN_1 = (u'b! d(! !H!:!M(!:!S)?)?! Y(! ?!Z|! ?!z)?', u'Y!m!d!H!M!S(!Z|!z)', u'!y!m!d!H!M!S(!Z|!z)')
 
+# hand-written parsers for the usual layouts (see simpledate.fast).
+register_fast_path(ISO_8601[0], iso_8601)
+register_fast_path(auto_invert(RFC_2822[0]), rfc_2822)
+
 DEFAULT_FORMAT = u'%Y-%m-%d %H:%M:%S.%f %Z'
 DEFAULT_FORMATS = ISO_8601 + RFC_2822 + ASN_1
 
@@ -83,6 +91,9 @@ def tzinfo_tzname(tzinfo, datetime, is_dst):
     :param is_dst: To resolve ambiguities.
     :return: The name of the tzinfo at the given time.
     '''
+    timeline = tzinfo_timeline(tzinfo)
+    if timeline is not None:
+        return timeline.names[timeline.local_index(timeline.wall_seconds(tzinfo, datetime), is_dst)]
     datetime = tzinfo_astimezone(tzinfo, datetime)
     # don't understand why we need this, but without it get very odd results.
     datetime = datetime.replace(tzinfo=None)
@@ -115,6 +126,10 @@ def tzinfo_utcoffset(tzinfo, datetime):
     :param datetime: The time at which we want the offset.
     :return: The UTC offset of the tzinfo at the given time.
     '''
+    timeline = tzinfo_timeline(tzinfo)
+    if timeline is not None:
+        # pytz's utcoffset() localizes with is_dst=None
+        return timeline.deltas[timeline.local_index(timeline.wall_seconds(tzinfo, datetime), None)]
     datetime = tzinfo_astimezone(tzinfo, datetime)
     # don't understand why we need this, but without it get very odd results.
     datetime = datetime.replace(tzinfo=None)
@@ -147,6 +162,209 @@ def datetime_timestamp(datetime):
         return timegm(utc_datetime.timetuple()) + utc_datetime.microsecond / 1e6
 
 
+def datetime_seconds(datetime):
+    u'''
+    Whole seconds since the Unix epoch.  For an aware datetime this is the
+    UTC instant; for a naive datetime it is the wall-clock time, read as if
+    it were UTC.
+    '''
+    if datetime.tzinfo is None:
+        return wall_seconds(datetime)
+    else:
+        return timegm(datetime.utctimetuple())
+
+
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+UTC_EPOCH = dt.datetime(1970, 1, 1, tzinfo=utc)
+
+def datetime_epoch_us(datetime):
+    u'''
+    Microseconds since the Unix epoch.  Like `datetime_seconds`, an aware
+    datetime gives the UTC instant and a naive datetime is read as UTC.
+    '''
+    micros = wall_seconds(datetime) * 1000000 + datetime.microsecond
+    offset = datetime.utcoffset()
+    if offset:
+        micros -= (offset.days * 86400 + offset.seconds) * 1000000 + offset.microseconds
+    return micros
+
+
+def wall_seconds(datetime):
+    u'''
+    Whole seconds since the Unix epoch for the wall-clock time (any tzinfo
+    is ignored, and not called).
+    '''
+    return (datetime.toordinal() - EPOCH_ORDINAL) * 86400 + \
+           datetime.hour * 3600 + datetime.minute * 60 + datetime.second
+
+
+
+# Compiled timezone data.
+
+
+EARLIEST, LATEST = -2**63, 2**63 - 1  # open ends of unlimited intervals
+MIN_SECONDS, MAX_SECONDS = wall_seconds(dt.datetime.min), wall_seconds(dt.datetime.max)
+SIX_HOURS, ONE_DAY = 6 * 3600, 86400
+
+
+class ZoneTimeline(object):
+    u'''
+    The transitions of a pytz timezone as parallel arrays (UTC epoch seconds
+    for the start of each period, then the offset, DST flag and name in that
+    period), so that the offset or name at any time is found with a bisect
+    on an integer, rather than by constructing and converting datetimes.
+
+    `local_index` reproduces pytz's `localize` (including its treatment of
+    ambiguous and non-existent times) so results match the pytz API exactly.
+    '''
+
+    __slots__ = (u'transitions', u'offsets', u'dsts', u'names', u'deltas')
+
+    def __init__(self, transitions, info):
+        u'''
+        :param transitions: The start of each period, in UTC epoch seconds.
+        :param info: The (utcoffset, dst, tzname) for each period.
+        :return: A new timeline.
+        '''
+        # python 2 has no 'q' arrays; doubles hold these values exactly.
+        self.transitions = array('d', transitions)
+        self.offsets = array('l', (int(offset.total_seconds()) for offset, _, _ in info))
+        self.dsts = array('b', (bool(dst) for _, dst, _ in info))
+        self.names = tuple(name for _, _, name in info)
+        self.deltas = tuple(offset for offset, _, _ in info)
+
+    @staticmethod
+    def compile(tzinfo):
+        u'''
+        :param tzinfo: A pytz timezone.
+        :return: The equivalent timeline, or `None` if the zone is not one we
+                 understand.
+        '''
+        if isinstance(tzinfo, DstTzInfo):
+            return ZoneTimeline(imap(wall_seconds, tzinfo._utc_transition_times), tzinfo._transition_info)
+        elif isinstance(tzinfo, StaticTzInfo) or isinstance(tzinfo, UTC.__class__):
+            return ZoneTimeline((EARLIEST,), ((tzinfo.utcoffset(None), tzinfo.dst(None), tzinfo.tzname(None)),))
+        else:
+            return None
+
+    def utc_index(self, seconds):
+        u'''
+        :param seconds: A UTC instant, in epoch seconds.
+        :return: The period containing the instant.
+        '''
+        return max(0, bisect_right(self.transitions, seconds) - 1)
+
+    def local_index(self, seconds, is_dst):
+        u'''
+        :param seconds: A wall-clock time, in epoch seconds.
+        :param is_dst: Used to resolve ambiguous and non-existent times (if
+                       `None` then those raise an error, as in pytz).
+        :return: The period used for the time (as chosen by pytz `localize`).
+        '''
+        # the periods that contain the time a day either side are the only
+        # possibilities; we keep those where the time maps back to itself.
+        # usually both are the same period, and then that is the answer.
+        before = bisect_right(self.transitions, seconds - ONE_DAY)
+        if before == bisect_right(self.transitions, seconds + ONE_DAY) and MIN_SECONDS + ONE_DAY <= seconds:
+            return max(0, before - 1)
+        possible = {}
+        for delta in (-ONE_DAY, ONE_DAY):
+            if MIN_SECONDS <= seconds + delta <= MAX_SECONDS:
+                offset = self.offsets[self.utc_index(seconds + delta)]
+                index = self.utc_index(seconds - offset)
+                if self.offsets[index] == offset:
+                    possible.setdefault(seconds - offset, index)
+        if len(possible) == 1:
+            return possible.popitem()[1]
+        elif not possible:
+            if is_dst is None:
+                raise NonExistentTimeError(self.wall_datetime(seconds))
+            elif is_dst:
+                return self.local_index(seconds + SIX_HOURS, is_dst)
+            else:
+                return self.local_index(seconds - SIX_HOURS, is_dst)
+        elif is_dst is None:
+            raise AmbiguousTimeError(self.wall_datetime(seconds))
+        else:
+            filtered = dict((utc, index) for utc, index in possible.items() if bool(self.dsts[index]) == is_dst)
+            if len(filtered) == 1:
+                return filtered.popitem()[1]
+            if not filtered:
+                filtered = possible
+            return filtered[min(filtered) if is_dst else max(filtered)]
+
+    def wall_seconds(self, tzinfo, datetime):
+        u'''
+        :param tzinfo: The zone this timeline was compiled from.
+        :param datetime: A naive (wall-clock) or aware datetime.
+        :return: The wall-clock time in the zone, in epoch seconds (following
+                 `tzinfo_astimezone`, a naive value is already wall-clock).
+        '''
+        if datetime.tzinfo is None or datetime.tzinfo is tzinfo:
+            return wall_seconds(datetime)
+        else:
+            seconds = wall_seconds(datetime) - int(datetime.utcoffset().total_seconds())
+            return seconds + self.offsets[self.utc_index(seconds)]
+
+    def window(self, seconds, utc=False):
+        u'''
+        :param seconds: A wall-clock time (or UTC instant if `utc` is true),
+                        in epoch seconds.
+        :param utc: Is `seconds` a UTC instant?
+        :return: The interval (lo, hi) containing `seconds` over which the
+                 offset and name do not change and localization is not
+                 ambiguous, or `None` if `seconds` is itself ambiguous or
+                 non-existent.
+        '''
+        transitions, offsets = self.transitions, self.offsets
+        if utc:
+            index = self.utc_index(seconds)
+        else:
+            index = self.local_index(seconds, False)
+        offset = offsets[index]
+        # the wall-clock times either side of a transition overlap (or leave a
+        # gap), so the unambiguous part of a period is narrower.
+        if index:
+            lo = int(transitions[index]) + max(offsets[index-1], offset)
+        else:
+            lo = EARLIEST
+        if index + 1 < len(transitions):
+            hi = int(transitions[index+1]) + min(offset, offsets[index+1])
+        else:
+            hi = LATEST
+        if utc:
+            lo = lo - offset if lo != EARLIEST else lo
+            hi = hi - offset if hi != LATEST else hi
+        return (lo, hi) if lo <= seconds < hi else None
+
+    @staticmethod
+    def wall_datetime(seconds):
+        u'''
+        :param seconds: A wall-clock time, in epoch seconds.
+        :return: The equivalent naive datetime (for error messages).
+        '''
+        return dt.datetime(1970, 1, 1) + dt.timedelta(seconds=seconds)
+
+
+TIMELINES = {}
+
+def tzinfo_timeline(tzinfo):
+    u'''
+    :param tzinfo: A timezone.
+    :return: The (cached) compiled timeline for the zone, or `None` if it is
+             not a pytz timezone.
+    '''
+    try:
+        return TIMELINES[tzinfo]
+    except KeyError:
+        # localized variants of a pytz zone share the same data
+        if isinstance(tzinfo, DstTzInfo):
+            base = tzinfo._tzinfos[tzinfo._transition_info[0]]
+            if base is not tzinfo:
+                return TIMELINES.setdefault(tzinfo, tzinfo_timeline(base))
+        return TIMELINES.setdefault(tzinfo, ZoneTimeline.compile(tzinfo))
+
+
 
 # Utilities to help with argument handling and the like.
 
@@ -246,7 +464,7 @@ class PyTzFactoryError(SimpleDateError):
         :param country: The country code passed to the search method.
         :param unsafe: The unsafe flag passed to the search method.
         '''
-        super(self.__class__, self).__init__(PyTzFactoryError.format(message, timezones, datetime, is_dst, country, unsafe))
+        super(PyTzFactoryError, self).__init__(PyTzFactoryError.format(message, timezones, datetime, is_dst, country, unsafe))
 
     @staticmethod
     def format(message, timezones, datetime, is_dst, country, unsafe):
@@ -309,6 +527,22 @@ class SingleInstantTzError(SimpleDateError):
         super(self.__class__, self).__init__(u'Attempted to use {0} (defined only for {1}) on {2}', tzinfo, datetime, other)
 
 
+class PeriodTzError(SimpleDateError):
+    u'''
+    An attempt was made to use a timezone defined only for a period of time
+    (while some other zone had that offset and name) outside that period.
+    '''
+
+    def __init__(self, tzinfo, start, end, other):
+        u'''
+        :param tzinfo: The offset and name.
+        :param start: The start of the period (UTC datetime or `None`).
+        :param end: The end of the period (UTC datetime or `None`).
+        :param other: The time at which the timezone was used.
+        '''
+        super(PeriodTzError, self).__init__(u'Attempted to use {0} (defined only from {1} to {2}) on {3}', tzinfo, start, end, other)
+
+
 
 # Classes implementing the core functionality.
 
@@ -318,7 +552,7 @@ class SingleInstantTz(dt.tzinfo):
     A timezone valid only for one particular instant.
     '''
 
-    __slots__ = (u'__tz', u'__datetime')
+    __slots__ = (u'__tz', u'__datetime', u'__instant', u'__offset')
 
     def __init__(self, tzinfo, datetime, is_dst):
         u'''
@@ -329,32 +563,31 @@ class SingleInstantTz(dt.tzinfo):
         '''
         offset = tzinfo_utcoffset(tzinfo, datetime)
         name = tzinfo_tzname(tzinfo, datetime, is_dst)
-        self.__tz = dt.timezone(offset, name)
+        self.__tz = NamedOffset(offset, name)
         # store as utc so that we can easily compare with other values.
         self.__datetime = tzinfo_astimezone(utc, tzinfo_astimezone(self.__tz, datetime))
+        # and as epoch microseconds, so that the check is a single comparison.
+        self.__instant = datetime_epoch_us(self.__datetime)
+        self.__offset = (offset.days * 86400 + offset.seconds) * 1000000 + offset.microseconds
 
     def __check(self, method, datetime):
         u'''
         :param method: The method we want to call.
-        :param datetime: The instant we want to use the timezone at.
+        :param datetime: The instant we want to use the timezone at (naive
+                         values are read as UTC).
         :return: The result from the method call, if the instant matches.
         '''
         # take care to avoid triggering recursion
-        check = datetime
-        if check.tzinfo is self:
-            check = check.replace(tzinfo=self.__tz)
-        if check.tzinfo:
-            check = check.astimezone(utc)
-        if check.year == self.__datetime.year and \
-                check.month == self.__datetime.month and \
-                check.day == self.__datetime.day and \
-                check.hour == self.__datetime.hour and \
-                check.minute == self.__datetime.minute and \
-                check.second == self.__datetime.second and \
-                check.microsecond == self.__datetime.microsecond:
+        if datetime.tzinfo is self:
+            instant = wall_seconds(datetime) * 1000000 + datetime.microsecond - self.__offset
+        else:
+            instant = datetime_epoch_us(datetime)
+        if instant == self.__instant:
             return method(datetime)
         else:
-            raise SingleInstantTzError(self.__tz, self.__datetime, datetime)
+            # (wall-clock, without this timezone, to avoid recursion when displayed)
+            raise SingleInstantTzError(self.__tz, self.__datetime,
+                                       datetime.replace(tzinfo=None) if datetime.tzinfo is self else datetime)
 
     # delegate the usual API after checking (or, in some cases related to
     # conversion, check afterwards).
@@ -396,29 +629,287 @@ class SingleInstantTz(dt.tzinfo):
         return tzinfo_astimezone(self, datetime)
 
 
+class PeriodTz(dt.tzinfo):
+    u'''
+    A timezone with a fixed offset and name, valid only for the period in
+    which some zone (eg America/New_York for EDT) has that offset and name.
+    Within the period it can be used like any other fixed offset timezone
+    (for arithmetic, conversion, etc).
+
+    Instances are shared (see `period_tz`), so all times found in the same
+    period use the same instance.
+    '''
+
+    __slots__ = (u'__tz', u'__offset', u'__zone', u'__start', u'__end')
+
+    def __init__(self, offset, name, zone, start, end):
+        u'''
+        :param offset: The offset for the timezone, in seconds.
+        :param name: The name of the timezone.
+        :param zone: The name of the zone the period is taken from.
+        :param start: The start of the period, in UTC epoch seconds.
+        :param end: The end (exclusive) of the period, in UTC epoch seconds.
+        '''
+        self.__tz = NamedOffset(dt.timedelta(seconds=offset), name)
+        self.__offset = offset
+        self.__zone = zone
+        self.__start = start
+        self.__end = end
+
+    @staticmethod
+    def __datetime(seconds):
+        if seconds in (EARLIEST, LATEST):
+            return None
+        return UTC_EPOCH + dt.timedelta(seconds=seconds)
+
+    def __check(self, method, datetime):
+        u'''
+        :param method: The method we want to call.
+        :param datetime: The time we want to use the timezone at (naive
+                         values are wall-clock time in this timezone).
+        :return: The result from the method call, if within the period.
+        '''
+        if datetime is not None:
+            if datetime.tzinfo is None or datetime.tzinfo is self:
+                seconds = wall_seconds(datetime) - self.__offset
+            else:
+                seconds = datetime_seconds(datetime)
+            if not self.__start <= seconds < self.__end:
+                # (wall-clock, without this timezone, to avoid recursion when displayed)
+                raise PeriodTzError(self.__tz, self.__datetime(self.__start), self.__datetime(self.__end),
+                                    datetime.replace(tzinfo=None) if datetime.tzinfo is self else datetime)
+        return method(datetime)
+
+    def tzname(self, datetime):
+        return self.__check(self.__tz.tzname, datetime)
+
+    def utcoffset(self, datetime):
+        return self.__check(self.__tz.utcoffset, datetime)
+
+    def dst(self, datetime):
+        return self.__check(self.__tz.dst, datetime)
+
+    def fromutc(self, datetime):
+        # the argument has utc fields, so check after conversion
+        datetime = self.__tz.fromutc(datetime.replace(tzinfo=self.__tz)).replace(tzinfo=self)
+        return self.__check(lambda x: x, datetime)
+
+    def __str__(self):
+        return unicode(self.__tz)
+
+    def __repr__(self):
+        return u'{0}({1!r}, {2!r}, {3!r}, {4!r}, {5!r})'.format(
+            self.__class__.__name__, self.__tz.utcoffset(None), unicode(self.__tz), self.__zone,
+            self.__datetime(self.__start), self.__datetime(self.__end))
+
+    def localize(self, datetime, is_dst=False):
+        if datetime.tzinfo is not None:
+            raise ValueError(u'Not naive datetime (tzinfo is already set)')
+        return self.__check(lambda x: x, datetime.replace(tzinfo=self))
+
+    def normalize(self, datetime, is_dst=False):
+        if datetime.tzinfo is None:
+            raise ValueError(u'Naive time - no tzinfo set')
+        return tzinfo_astimezone(self, datetime)
+
+
+PERIOD_ZONES = {}  # (offset, name, zone, start, end) -> PeriodTz
+
+def period_tz(tzinfo, datetime, is_dst):
+    u'''
+    :param tzinfo: A timezone (usually one of several with the same offset
+                   and name at `datetime`).
+    :param datetime: The time at which the timezone is used.
+    :param is_dst: To resolve ambiguities.
+    :return: The (shared) `PeriodTz` for the offset and name of `tzinfo` at
+             `datetime`, or a `SingleInstantTz` if the period is not known.
+    '''
+    timeline = None if datetime is None else tzinfo_timeline(tzinfo)
+    if timeline is None:
+        return SingleInstantTz(tzinfo, datetime, is_dst)
+    # as SingleInstantTz
+    delta = tzinfo_utcoffset(tzinfo, datetime)
+    name = tzinfo_tzname(tzinfo, datetime, is_dst)
+    offset = delta.days * 86400 + delta.seconds
+    if datetime.tzinfo is None:
+        seconds = wall_seconds(datetime) - offset
+    else:
+        seconds = datetime_seconds(datetime)
+    index = timeline.utc_index(seconds)
+    if delta.microseconds or timeline.offsets[index] != offset or timeline.names[index] != name:
+        return SingleInstantTz(tzinfo, datetime, is_dst)
+    start = int(timeline.transitions[index]) if index else EARLIEST
+    end = int(timeline.transitions[index+1]) if index + 1 < len(timeline.transitions) else LATEST
+    key = (offset, name, unicode(tzinfo), start, end)
+    try:
+        return PERIOD_ZONES[key]
+    except KeyError:
+        return PERIOD_ZONES.setdefault(key, PeriodTz(*key))
+
+
+class AbbreviationIndex(object):
+    u'''
+    An inverted index from timezone names (EST, CLT, BST...) to the zones
+    that use them, and when.  For each name the time line is split into
+    segments (at every point where some zone starts or stops using the name)
+    and each segment records the zones active within it, so a lookup is a
+    single bisect.
+
+    The intervals are widened by the offsets either side of each transition,
+    so that a query with a naive (wall-clock) datetime, as well as one with
+    an aware (UTC) instant, gives a superset of the matching zones.  Callers
+    must still check each candidate exactly (the widening means that a few
+    zones near a transition may be returned in error).
+
+    Zones that cannot be introspected are not indexed (see `indexed`) and
+    must always be checked exactly.
+    '''
+
+    def __init__(self, timezones):
+        u'''
+        :param timezones: The tzinfo instances to index.
+        :return: A new index.
+        '''
+        spans, indexed = defaultdict(list), set()
+        for tzinfo in timezones:
+            intervals = self.__intervals(tzinfo)
+            if intervals is not None:
+                indexed.add(tzinfo)
+                for start, end, name in intervals:
+                    spans[name].append((start, end, tzinfo))
+        self.__indexed = frozenset(indexed)
+        self.__segments = dict((name, self.__segment(spans[name])) for name in spans)
+
+    @staticmethod
+    def __intervals(tzinfo):
+        u'''
+        :param tzinfo: The zone to describe.
+        :return: A list of (start, end, name) in epoch seconds, widened to
+                 cover both UTC and local wall-clock times, or `None` if the
+                 zone cannot be introspected.
+        '''
+        timeline = tzinfo_timeline(tzinfo)
+        if timeline is None:
+            return None
+        starts = [EARLIEST] + list(timeline.transitions[1:])
+        ends = starts[1:] + [LATEST]
+        offsets = timeline.offsets
+        # a naive time is wall-clock, so shifted by the offsets either side of
+        # the transition.  an aware time is converted to wall-clock before
+        # pytz re-localizes it, so may be attributed to a neighbouring
+        # interval, hence the further widening by the extreme offsets.
+        intervals = []
+        for i, (start, end, name) in enumerate(zip(starts, ends, timeline.names)):
+            around = offsets[max(i-1, 0):i+2]
+            if start != EARLIEST:
+                start += min(offsets[i-1], offsets[i]) - max(0, max(around))
+            if end != LATEST:
+                end += max(offsets[i], offsets[i+1]) - min(0, min(around))
+            intervals.append((start, end, name))
+        return intervals
+
+    @staticmethod
+    def __segment(spans):
+        u'''
+        :param spans: A list of (start, end, tzinfo) for a single name.
+        :return: Sorted segment boundaries, and the zones active from each
+                 boundary to the next.
+        '''
+        events = defaultdict(list)
+        for start, end, tzinfo in spans:
+            events[start].append((1, tzinfo))
+            events[end].append((-1, tzinfo))
+        bounds, zones, active, shared = [], [], defaultdict(int), {}
+        for bound in sorted(events):
+            for delta, tzinfo in events[bound]:
+                active[tzinfo] += delta
+                if not active[tzinfo]:
+                    del active[tzinfo]
+            current = frozenset(active)
+            bounds.append(bound)
+            zones.append(shared.setdefault(current, current))
+        return bounds, zones
+
+    @property
+    def indexed(self):
+        u'''
+        :return: The zones described by the index.
+        '''
+        return self.__indexed
+
+    def candidates(self, name, datetime):
+        u'''
+        :param name: The timezone name (eg EST).
+        :param datetime: When the name is used (naive is wall-clock time).
+        :return: The indexed zones that might use the name at that time.
+        '''
+        return self.segment(name, datetime_seconds(datetime))[2]
+
+    def segment(self, name, seconds):
+        u'''
+        :param name: The timezone name (eg EST).
+        :param seconds: When the name is used, in epoch seconds (wall-clock
+                        or UTC).
+        :return: The segment (lo, hi, zones) containing `seconds`, where
+                 `zones` are the indexed zones that might use the name at
+                 any time from `lo` up to (but excluding) `hi`.
+        '''
+        try:
+            bounds, zones = self.__segments[name]
+        except KeyError:
+            return EARLIEST, LATEST, frozenset()
+        i = bisect_right(bounds, seconds) - 1
+        if i < 0:
+            return EARLIEST, bounds[0], frozenset()
+        return bounds[i], bounds[i+1] if i + 1 < len(bounds) else LATEST, zones[i]
+
+
 class PyTzFactory(DebugLog):
     u'''
     Generate timezones (mainly from strings, but other formats are supported
     in places, too).
 
-    IMPORTANT: Not thread safe.
+    If `cache_size` is given then the results of `search` are cached.  Each
+    entry is valid over the interval of time in which none of the zones
+    involved change (so, for example, all searches for 'EDT' in one summer
+    share a single entry).
+
+    Instances can be shared between threads (the zones are never modified;
+    only the search order is kept per-thread).
     '''
 
-    def __init__(self, timezones=None, countries=None, debug=False):
+    def __init__(self, timezones=None, countries=None, debug=False, cache_size=0):
         u'''
         :param timezones: The zones to search by default.
         :param countries: Countries to use by default (None implies all).
         :param debug: If true, display debug messages to stdout.
+        :param cache_size: The number of `search` results to cache (0 disables
+                           the cache).
         :return: A new instance of the factory.
         '''
+        self.__cache = IntervalCache(cache_size)
+        # expanding the zones loads every pytz file, so wait until needed.
+        self.__zones = LazyInstance(lambda: self.__expand_zones(timezones, countries, debug))
+
+    def __expand_zones(self, timezones, countries, debug):
+        u'''
+        :param timezones: The zones to search by default.
+        :param countries: Countries to use by default (None implies all).
+        :param debug: If true, display debug messages to stdout.
+        :return: The (sorted zones, abbreviation index, unindexed zones) that
+                 are searched by default.
+        '''
         if timezones is None:
             timezones = common_timezones + [Z]
         timezones = set.union(*[set(self.expand_tz(zone, debug=debug)) for zone in timezones])
         if countries:
             timezones = timezones.intersection(self.expand_country(*countries, debug=debug))
-        self.__sorted_zones = MRUSortedIterable(timezones)
+        index = AbbreviationIndex(timezones)
+        return MRUSortedIterable(timezones), index, frozenset(timezones) - index.indexed
 
     def search(self, *timezones, **_3to2kwargs):
+        if 'cache' in _3to2kwargs: cache = _3to2kwargs['cache']; del _3to2kwargs['cache']
+        else: cache = None
         if 'debug' in _3to2kwargs: debug = _3to2kwargs['debug']; del _3to2kwargs['debug']
         else: debug = False
         if 'unsafe' in _3to2kwargs: unsafe = _3to2kwargs['unsafe']; del _3to2kwargs['unsafe']
@@ -435,7 +926,7 @@ class PyTzFactory(DebugLog):
         To get a timezone for a given date:
         >>> from datetime import datetime
         >>> PyTzFactory().search('EDT', datetime=datetime(2013,6,1))
-        SingleInstantTz(datetime.timedelta(-1, 72000), 'EDT', datetime.datetime(2013, 6, 1, 0, 0, tzinfo=<UTC>))
+        PeriodTz(datetime.timedelta(-1, 72000), 'EDT', 'America/New_York', datetime.datetime(2013, 3, 10, 7, 0, tzinfo=<UTC>), datetime.datetime(2013, 11, 3, 6, 0, tzinfo=<UTC>))
 
         To test whether GMT is a valid timezone in London in January:
         >>> PyTzFactory().search('Europe/London', 'GMT', datetime=datetime(2013,1,1))
@@ -455,7 +946,7 @@ class PyTzFactory(DebugLog):
 
         but can be resolve by, for example:
         >>> PyTzFactory().search('EST', country='US', datetime=datetime(2013,1,1))
-        SingleInstantTz(datetime.timedelta(-1, 68400), 'EST', datetime.datetime(2013, 1, 1, 0, 0, tzinfo=<UTC>))
+        PeriodTz(datetime.timedelta(-1, 68400), 'EST', 'America/New_York', datetime.datetime(2012, 11, 4, 6, 0, tzinfo=<UTC>), datetime.datetime(2013, 3, 10, 7, 0, tzinfo=<UTC>))
 
         or, since PyTZ defines this as an unlimited timezone (note that `datetime` is omitted):
         >>> PyTzFactory().search('EST')
@@ -475,12 +966,42 @@ class PyTzFactory(DebugLog):
         :param country: A country code (or tuple of codes).  If given, only timezones in that country are considered.
         :param unsafe: Take the first timezone found.
         :param debug: Print an explanation of the process followed to stdout?
+        :param cache: An `IntervalCache` to use instead of the factory's own
+                      (eg to share results within a batch).
         :return: A timezone consistent with the parameters given.
         '''
 
         log = self._get_log(debug)
         datetime = always_datetime(datetime)
-        log(PyTzFactoryError.format(u'Searching', timezones, datetime, is_dst, country, unsafe))
+        if log:
+            log(u'{0}', PyTzFactoryError.format(u'Searching', timezones, datetime, is_dst, country, unsafe))
+
+        if cache is None:
+            cache = self.__cache
+        key = self.__cache_key(cache, timezones, datetime, is_dst, country, unsafe)
+        if key is None:
+            found, instant, _ = self.__search(timezones, datetime, is_dst, country, unsafe, debug, log)
+        else:
+            point = 0 if datetime is None else datetime_seconds(datetime)
+            cached = cache.get(key, point)
+            if cached is None:
+                found, instant, known = self.__search(timezones, datetime, is_dst, country, unsafe, debug, log)
+                window = self.__cache_window(timezones, datetime, country, known, point)
+                if window is not None:
+                    log(u'Caching {0} from {1} to {2}', found, *window)
+                    cache.put(key, window[0], window[1], (found, instant))
+            else:
+                found, instant = cached
+                log(u'Found (cached) {0}', found)
+        return period_tz(found, datetime, is_dst) if instant else found
+
+    def __search(self, timezones, datetime, is_dst, country, unsafe, debug, log):
+        u'''
+        The uncached implementation of `search`.
+
+        :return: The timezone found, whether it must be wrapped as a single
+                 instant timezone, and the timezones it was chosen from.
+        '''
 
         # either start with the timezones by country or 'everything' (None).
         if country is None:
@@ -495,7 +1016,7 @@ class PyTzFactory(DebugLog):
 
         # if we never filtered anything, we have everything.
         if known is None:
-            known = set(self.__sorted_zones)
+            known = set(self.__zones.value[0])
 
         # in the unsafe case we don't force evaluation of the complete
         # generator.  instead, we pull the first value and return as a
@@ -504,7 +1025,7 @@ class PyTzFactory(DebugLog):
             try:
                 found = known.next()
                 log(u'Found (unsafe) {0}', found)
-                return SingleInstantTz(found, datetime, is_dst)
+                return found, True, [found]
             except StopIteration:
                 raise NoTimezone(timezones, datetime, is_dst, country, unsafe)
 
@@ -518,17 +1039,79 @@ class PyTzFactory(DebugLog):
             elif len(known) == 1:
                 found = known[0]
                 log(u'Found {0}', found)
-                return found
+                return found, False, known
             else:
                 distinct = list(self.distinct(known, datetime=datetime, debug=debug))
                 log(u'Have {0} distinct timezone(s)', len(distinct))
                 if len(distinct) == 1:
                     found = iter(distinct).next()
                     log(u'Found {0}', found)
-                    return SingleInstantTz(found, datetime, is_dst)
+                    return found, True, known
                 else:
                     raise AmbiguousTimezone(distinct, timezones, datetime, is_dst, country, unsafe)
 
+    @staticmethod
+    def __cache_key(cache, timezones, datetime, is_dst, country, unsafe):
+        u'''
+        :return: The key used to cache a search (`datetime` is handled
+                 separately, but whether it is naive matters), or `None` if
+                 the search cannot be cached.
+        '''
+        if not cache.maxsize:
+            return None
+        # the local zone is not fixed, so not cached.
+        if any(tz is None for tz in chain(*(always_tuple(tz, none=(None,)) for tz in timezones))):
+            return None
+        key = (timezones, is_dst, always_tuple(country) if country is not None else None, unsafe,
+               None if datetime is None else (datetime.tzinfo is None, datetime.tzinfo))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def __cache_window(self, timezones, datetime, country, known, point):
+        u'''
+        :param known: The timezones the search result was chosen from.
+        :param point: The value of `datetime` in epoch seconds.
+        :return: The interval (lo, hi) around `point` over which the search
+                 gives the same result, or `None` if that cannot be found.
+        '''
+        lo, hi = EARLIEST, LATEST
+        if datetime is None:
+            return lo, hi
+        names = [tz for tz in chain(*(always_tuple(tz) for tz in timezones)) if isinstance(tz, unicode)]
+        # distinct compares the offsets of all the zones found.
+        zones = set(known) if len(known) > 1 else set()
+        # names are matched against every candidate from the index (which
+        # are fixed within a segment), and every zone it does not know.
+        if names:
+            _, index, unindexed = self.__zones.value
+            if country is None:
+                zones.update(unindexed)
+            else:
+                zones.update(zone for zone in self.expand_country(*always_tuple(country))
+                             if zone not in index.indexed)
+            for name in names:
+                start, end, candidates = index.segment(name, point)
+                lo, hi = max(lo, start), min(hi, end)
+                zones.update(candidates)
+        utc = datetime.tzinfo is not None
+        for tzinfo in zones:
+            timeline = tzinfo_timeline(tzinfo)
+            window = None if timeline is None else timeline.window(point, utc)
+            if window is None:
+                return None
+            lo, hi = max(lo, window[0]), min(hi, window[1])
+        return lo, hi
+
+    def cache_info(self):
+        u'''
+        :return: Statistics for the `search` cache (hits, misses, evictions,
+                 maxsize, currsize).
+        '''
+        return self.__cache.info()
+
     def distinct(self, timezones, datetime=None, debug=False):
         u'''
         :param timezones: Timezones to filter
@@ -598,11 +1181,7 @@ class PyTzFactory(DebugLog):
         non_local = { 'count' : 0 }
 
         if known is None:
-            known_set = None
-            try:
-                known_sorted = self.__sorted_zones
-            except AttributeError:
-                known_sorted = tuple()
+            known_set = known_sorted = None  # all zones (expanded if needed)
         else:
             if not known:
                 log(u'No known zones for {0!r}', timezones)
@@ -661,7 +1240,18 @@ class PyTzFactory(DebugLog):
             if isinstance(tz, unicode):
                 if datetime is None:
                     raise PyTzFactoryError(u'Cannot expand limited timezone without datetime', timezones, datetime, is_dst)
+                # the index excludes most zones cheaply; only the candidates
+                # (and any zones it does not know about) are checked in full.
+                # (names are only expanded by datetime after construction,
+                # so the zones are always available here.)
+                sorted_zones, index, _ = self.__zones.value
+                if known_sorted is None:
+                    known_sorted = sorted_zones
+                indexed, candidates = index.indexed, index.candidates(tz, datetime)
+                log(u'Index gave {0} candidate(s) for {1}', len(candidates), tz)
                 for tzinfo in known_sorted:
+                    if tzinfo in indexed and tzinfo not in candidates:
+                        continue
                     try:
                         name = tzinfo_tzname(tzinfo, datetime, is_dst)
                         if tz == name:
@@ -697,20 +1287,61 @@ class PyTzFactory(DebugLog):
             count += len(zones)
         log(u'Expanded country codes to {0} timezones', count)
 
+# the zones are only expanded on first search, so importing the package stays cheap.
 DEFAULT_TZ_FACTORY = PyTzFactory()
 
 
+class ParseFailure(object):
+    u'''
+    Returned in place of a result by `SimpleDateParser.parse_many` when an
+    input could not be parsed.  Is false in a boolean context.
+    '''
+
+    __slots__ = (u'date', u'error')
+
+    def __init__(self, date, error):
+        u'''
+        :param date: The input that could not be parsed.
+        :param error: The exception describing the problem.
+        '''
+        self.date = date
+        self.error = error
+
+    def __nonzero__(self):
+        return False
+
+    def __repr__(self):
+        return u'{0}({1!r}, {2!r})'.format(self.__class__.__name__, self.date, self.error)
+
+
+# the number of resolved timezones retained while parsing a batch.
+BATCH_CACHE_SIZE = 100
+
+
 class SimpleDateParser(DebugLog):
     u'''
     Automate the parsing of SimpleDate instances from strings using a series
-    of formats (until one works).
-
-    IMPORTANT: Not thread safe.
+    of formats (the first, in order, that works is used).  The formats are
+    combined into a single regexp, so a single match finds the format, and
+    formats that cannot match the "shape" of the input (eg. a month name
+    when there are no letters) are not tried at all.
+
+    The order is always that given (earlier versions tried the most recently
+    successful format first, so input that more than one format could match
+    depended on the history of the parser).  Instances can be shared between
+    threads (the formats are never modified).
     '''
 
-    def __init__(self, formats=DEFAULT_FORMATS):
-        formats = tuple(imap(auto_invert, always_tuple(formats)))
-        self._formats = MRUSortedIterable(formats)
+    def __init__(self, formats=DEFAULT_FORMATS, locale=None):
+        u'''
+        :param formats: The formats to try, in order.
+        :param locale: The locale used for the names of months and days
+                       (eg 'es_ES.UTF-8'; `None` is the process locale).
+        '''
+        self._formats = tuple(imap(auto_invert, always_tuple(formats)))
+        self._locale = locale
+        # compiling the formats is slow, so wait until the first parse.
+        self._shapes = LazyInstance(lambda: ShapeIndex(self._formats, locale=locale))
 
     def parse(self, date,
               tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY,
@@ -738,10 +1369,11 @@ class SimpleDateParser(DebugLog):
 
         log = self._get_log(debug)
 
-        for read_fmt in self._formats:
+        for read_fmt, rebuild, convert, found in matches(date, self._shapes.candidates(date), self._locale):
             try:
 
-                tt, fraction, write_fmt = strptime(date, read_fmt)
+                tt, fraction = convert(found, False)
+                write_fmt = rebuild(found)
                 log(u'Raw parse results for {0}: {1!r}, {2!r}', read_fmt, tt, fraction)
                 datetime = dt.datetime(*(tt[:6] + (fraction,)))
 
@@ -769,6 +1401,66 @@ class SimpleDateParser(DebugLog):
                 log(u'Failed to parse {0} with {1} ({2})', date, read_fmt, e)
         raise SimpleDateError(u'Could not parse {0}', date)
 
+    def parse_many(self, dates,
+                   tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY,
+                   unsafe=False):
+        u'''
+        Parse a sequence of strings, as `parse`, but without the overhead of
+        logging or of exceptions for formats that do not match.  Timezones
+        found for one input are re-used for later inputs (with the same zone
+        and a date in the same period).
+
+        :param dates: The date strings to parse.
+        :param tz: A time zone to use if none available in the date (`None` is
+                   local).
+        :param is_dst: Is the date known to be summertime?  (`None` is
+                       'unknown').
+        :param country: A country code (or list of codes) to restrict the
+                        choice of timezone.
+        :param tz_factory: Converts from the timezone text, offset, etc, to a
+                           `dt.tzinfo` instance (must be a PyTzFactory).
+        :param unsafe: Take the first timezone found.
+        :return: A generator of (datetime, write format) pairs, with a
+                 `ParseFailure` in place of any input that could not be
+                 parsed.
+        '''
+        return self._parse_many(dates, lambda datetime, tzinfo, write_fmt: (tzinfo_localize(tzinfo, datetime, is_dst), write_fmt),
+                                tz, is_dst, country, tz_factory, unsafe)
+
+    def _parse_many(self, dates, result, tz, is_dst, country, tz_factory, unsafe):
+        u'''
+        The work behind `parse_many`, with the final step (which is given the
+        naive datetime, timezone and write format) supplied by the caller.
+
+        :param result: Called with (datetime, tzinfo, write format) to give
+                       the result for each input (errors give a
+                       `ParseFailure`).
+        '''
+        cache = IntervalCache(BATCH_CACHE_SIZE)
+        for date in dates:
+            try:
+                # as `parse`, a ValueError (from the fields, or the zone)
+                # moves on to the next format.
+                for _, rebuild, convert, groups in matches(date, self._shapes.candidates(date), self._locale):
+                    try:
+                        tt, fraction = convert(groups, False)
+                        datetime = dt.datetime(*(tt[:6] + (fraction,)))
+                        zones = ()
+                        if tt[-2] is not None: zones += (tt[-2],)
+                        elif tt[-1]: zones += (dt.timedelta(seconds=tt[-1]),)
+                        if tz is not None: zones += (tz,)
+                        if not zones: zones += (None,)  # use locale
+                        tzinfo = tz_factory.search(*zones, datetime=datetime, is_dst=is_dst, country=country, unsafe=unsafe, cache=cache)
+                        value = result(datetime, tzinfo, rebuild(groups))
+                        break
+                    except ValueError:
+                        pass
+                else:
+                    raise SimpleDateError(u'Could not parse {0}', date)
+            except (SimpleDateError, InvalidTimeError, ValueError), e:
+                value = ParseFailure(date, e)
+            yield value
+
 DEFAULT_DATE_PARSER = SimpleDateParser()
 
 
@@ -777,11 +1469,13 @@ class DateTimeWrapper(object):
     Provide consistent, attribute-based access to a datetime instances.
     '''
 
-    __slots__ = (u'__datetime', u'__format')
+    __slots__ = (u'__datetime', u'__format', u'__write', u'__sort_key')
 
     def __init__(self, datetime, format):
         self.__datetime = datetime
         self.__format = format
+        self.__write = None  # compiled format, on first use
+        self.__sort_key = None  # on first use
 
     @property
     def datetime(self):
@@ -853,48 +1547,68 @@ class DateTimeWrapper(object):
         return self.__datetime.tzinfo
 
     def __str__(self):
-        return self.__datetime.strftime(self.__format)
+        if self.__write is None:
+            self.__write = formatter(self.__format)
+        return self.__write(self.__datetime)
 
     def __repr__(self):
-        if isinstance(self.__datetime.tzinfo, SingleInstantTz):
+        if isinstance(self.__datetime.tzinfo, (SingleInstantTz, PeriodTz)):
             return u'{0}({1!r})'.format(self.__class__.__name__, unicode(self))
         else:
             return u'{0}({1!r}, tz={2!r})'.format(self.__class__.__name__, unicode(self), unicode(self.__datetime.tzinfo))
 
     def strftime(self, format):
-        return self.__datetime.strftime(auto_invert(format))
+        return formatter(auto_invert(format))(self.__datetime)
+
+    @property
+    def sort_key(self):
+        u'''
+        A key that orders values by instant (as microseconds since the Unix
+        epoch), then format and then timezone (name).  Comparisons (and so
+        the hash) use only the instant and format, so values in different
+        timezones can be equal; the timezone only breaks ties when sorting
+        with this as an explicit key (`sorted(dates, key=attrgetter('sort_key'))`).
+        '''
+        key = self.__sort_key
+        if key is None:
+            tzinfo = self.__datetime.tzinfo
+            key = (datetime_epoch_us(self.__datetime), self.__format, u'' if tzinfo is None else unicode(tzinfo))
+            self.__sort_key = key
+        return key
 
     def __eq__(self, other):
-        return isinstance(other, DateTimeWrapper) and self.__datetime == other.datetime and self.__format == other.__format
+        if isinstance(other, DateTimeWrapper): return self.sort_key[:2] == other.sort_key[:2]
+        else: return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.sort_key[:2])
 
     @property
     def naive(self):
         return DateTimeWrapper(self.__datetime.replace(tzinfo=None), self.__format)
 
     def __lt__(self, other):
-        if isinstance(other, DateTimeWrapper):
-            return self.__datetime < other.__datetime or \
-                   (self.__datetime == other.__datetime and self != other and repr(self) < repr(other))
-        else:
-            return NotImplemented
+        if isinstance(other, DateTimeWrapper): return self.sort_key[:2] < other.sort_key[:2]
+        else: return NotImplemented
 
     def __gt__(self, other):
-        if isinstance(other, DateTimeWrapper):
-            return self.__datetime > other.__datetime or \
-                   (self.__datetime == other.__datetime and self != other and repr(self) > repr(other))
+        if isinstance(other, DateTimeWrapper): return self.sort_key[:2] > other.sort_key[:2]
         else: return NotImplemented
 
     def __le__(self, other):
-        if isinstance(other, DateTimeWrapper): return self < other or self == other
+        if isinstance(other, DateTimeWrapper): return self.sort_key[:2] <= other.sort_key[:2]
         else: return NotImplemented
 
     def __ge__(self, other):
-        if isinstance(other, DateTimeWrapper): return self > other or self == other
+        if isinstance(other, DateTimeWrapper): return self.sort_key[:2] >= other.sort_key[:2]
         else: return NotImplemented
 
     def __add__(self, other):
         if isinstance(other, dt.timedelta):
-            return SimpleDate(datetime=self.__datetime+other, format=self.__format)
+            return from_datetime(self.__datetime+other, self.__format)
         else: return NotImplemented
 
     __radd__ = __add__
@@ -902,10 +1616,27 @@ class DateTimeWrapper(object):
     def __sub__(self, other):
         if isinstance(other, DateTimeWrapper): return self.__datetime - other.__datetime
         elif isinstance(other, dt.timedelta):
-            return SimpleDate(datetime=self.datetime-other, format=self.format)
+            return from_datetime(self.__datetime-other, self.__format)
         else: return NotImplemented
 
 
+def format_many(dates, format=None):
+    u'''
+    Format a sequence of dates, compiling each format only once.
+
+    :param dates: The dates to format (`DateTimeWrapper` instances, including
+                  `SimpleDate`, or datetimes if `format` is given).
+    :param format: The format to use (inverted if necessary, as `strftime`)
+                   or `None` for the format of each date.
+    :return: A list of strings (`None` for missing values).
+    '''
+    if format is None:
+        return [None if date is None else formatter(date.format)(date.datetime) for date in dates]
+    write = formatter(auto_invert(format))
+    return [None if date is None else write(date.datetime if isinstance(date, DateTimeWrapper) else date)
+            for date in dates]
+
+
 def single_format(format):
     u'''
     The SimpleDate constructor supports both a single format and a list.  If
@@ -920,6 +1651,29 @@ def single_format(format):
         return None
 
 
+def write_format(format):
+    u'''
+    :param format: A format (or formats), as given to the SimpleDate
+                   constructor.
+    :return: The format the constructor would use for output, when the
+             value is not parsed.
+    '''
+    return single_format(auto_invert(format)) or DEFAULT_FORMAT
+
+
+def from_datetime(datetime, format):
+    u'''
+    :param datetime: A datetime (naive values are localized by the
+                     constructor, as usual).
+    :param format: The format used for output (as `write_format`).
+    :return: A SimpleDate instance.
+    '''
+    if datetime.tzinfo is None:
+        return SimpleDate(datetime=datetime, format=format)
+    else:
+        return SimpleDate.from_aware(datetime, format)
+
+
 class SimpleDate(DateTimeWrapper, DebugLog):
     u'''
     A formatted date and time, associated with a timezone.
@@ -1187,13 +1941,14 @@ class SimpleDate(DateTimeWrapper, DebugLog):
                                 (u'hour', hour), (u'day', day), (u'month', month), (u'year', year_or_auto)])
             for name, value in spec.items():
                 if value is None:
-                    log(u'Default ' + name + u' to zero')
+                    log(u'Default {0} to zero', name)
                     spec[name] = 0
                 else: break  # don't allow gaps
             error = names(1, is_none, **spec)
             if error: raise SimpleDateError(u'Missing value{0} for {1}', u's' if len(error) > 1 else u'', u', '.join(error))
 
-            log(u'Constructing datetime from: {0}', u'; '.join(u'%s: %s' % (name, value) for name, value in reversed(list(spec.items()))))
+            if log:
+                log(u'Constructing datetime from: {0}', u'; '.join(u'%s: %s' % (name, value) for name, value in reversed(list(spec.items()))))
             datetime = dt.datetime(**spec)
             year_or_auto, month, day, hour, minute, second, microsecond = None, None, None, None, None, None ,None
 
@@ -1220,6 +1975,40 @@ class SimpleDate(DateTimeWrapper, DebugLog):
 
         log(u'Created {0}', self)
 
+    @classmethod
+    def from_aware(cls, datetime, format=DEFAULT_FORMAT):
+        u'''
+        Create an instance directly from an aware datetime, without the
+        inference (and timezone search) of the constructor.
+
+          >>> SimpleDate.from_aware(dt.datetime(2013, 6, 8, 12, 0, tzinfo=utc))
+          SimpleDate('2013-06-08 12:00:00.000000 UTC', tz='UTC')
+
+        :param datetime: A `dt.datetime` with a tzinfo.
+        :param format: The format used for output (used as given, so must
+                       already be inverted if necessary - see `write_format`).
+        :return: A SimpleDate instance.
+        '''
+        if datetime.tzinfo is None:
+            raise SimpleDateError(u'Cannot use naive datetime {0} (no timezone)', datetime)
+        date = cls.__new__(cls)
+        DateTimeWrapper.__init__(date, datetime, format)
+        return date
+
+    @classmethod
+    def from_epoch_us(cls, us, tzinfo, format=DEFAULT_FORMAT):
+        u'''
+        Create an instance directly from microseconds since the Unix epoch
+        (like `timestamp`, `tzinfo` functions as a conversion).
+
+        :param us: Microseconds since the Unix epoch (UTC).
+        :param tzinfo: A `dt.tzinfo` instance (not a name - nothing is
+                       searched).
+        :param format: The format used for output (as `from_aware`).
+        :return: A SimpleDate instance.
+        '''
+        return cls.from_aware((UTC_EPOCH + dt.timedelta(microseconds=us)).astimezone(tzinfo), format)
+
     def convert(self, tz=None, format=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False, debug=False):
         if tz is None and country is None:
             # avoid expanding this, because it might be a SingleInstantTimezone
@@ -1227,14 +2016,14 @@ class SimpleDate(DateTimeWrapper, DebugLog):
         else:
             zones = () if tz is None else (tz,)
             tz = tz_factory.search(*zones, datetime=self.datetime, is_dst=is_dst, country=country, unsafe=unsafe, debug=debug)
-        if format is None: format = self.format
-        return SimpleDate(datetime=tz.normalize(self.datetime.astimezone(tz)), format=format)
+        format = self.format if format is None else write_format(format)
+        return SimpleDate.from_aware(tz.normalize(self.datetime.astimezone(tz)), format)
 
     def replace(self, year=None, month=None, day=None, hour=None, minute=None, second=None, microsecond=None,
                 tz=None, format=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False, debug=False):
         datetime = self.datetime.replace(**set_kargs_only(year=year, month=month, day=day, hour=hour, minute=minute, second=second, microsecond=microsecond))
         if tz is None:
-            return SimpleDate(datetime, format=self.format if format is None else format)
+            return from_datetime(datetime, self.format if format is None else write_format(format))
         else:
             tzinfo = tz_factory.search(tz, datetime=datetime.replace(tzinfo=None), is_dst=is_dst, country=country, unsafe=unsafe, debug=debug)
             return SimpleDate(datetime, tz=tzinfo, format=self.format if format is None else format)
@@ -1265,6 +2054,17 @@ def get_local(name, builder):
         setattr(FACTORIES, name, value)
     return value
 
+def best_guess_parsers():
+    u'''
+    :return: The (parser, timezone factory) pairs used by `best_guess_utc`
+             (US first, then everything else), local to the thread.
+    '''
+    us_date_parser = get_local(u'us_date_parser', lambda: SimpleDateParser(MDY + DEFAULT_FORMATS))
+    eu_date_parser = get_local(u'eu_date_parser', lambda: SimpleDateParser(DMY + DEFAULT_FORMATS))
+    us_tz_factory = get_local(u'us_tz_factory', lambda: PyTzFactory(all_timezones, countries=[u'US']))
+    eu_tz_factory = get_local(u'eu_tz_factory', lambda: PyTzFactory(all_timezones, countries=exclude(u'US')))
+    return (us_date_parser, us_tz_factory), (eu_date_parser, eu_tz_factory)
+
 def best_guess_utc(date, debug=False):
     u'''
     Try US timezones with US formats, then everything else.
@@ -1273,13 +2073,27 @@ def best_guess_utc(date, debug=False):
     :param debug: If true, print a description of the logic followed.
     :return: A UTC datetime.
     '''
-    us_date_parser = get_local(u'us_date_parser', lambda: SimpleDateParser(MDY + DEFAULT_FORMATS))
-    eu_date_parser = get_local(u'eu_date_parser', lambda: SimpleDateParser(DMY + DEFAULT_FORMATS))
-    us_tz_factory = get_local(u'us_tz_factory', lambda: PyTzFactory(all_timezones, countries=[u'US']))
-    eu_tz_factory = get_local(u'eu_tz_factory', lambda: PyTzFactory(all_timezones, countries=exclude(u'US')))
+    (us_date_parser, us_tz_factory), (eu_date_parser, eu_tz_factory) = best_guess_parsers()
     try:
         date = SimpleDate(date, date_parser=us_date_parser, tz_factory=us_tz_factory, unsafe=True, debug=debug)
     except SimpleDateError:
         date = SimpleDate(date, date_parser=eu_date_parser, tz_factory=eu_tz_factory, unsafe=True, debug=debug)
     return date.utc.datetime
 
+def best_guess_many(dates):
+    u'''
+    Parse a sequence of dates, as `best_guess_utc`, but without constructing
+    a `SimpleDate` for each (see `SimpleDateParser.parse_many`).
+
+    :param dates: The dates to parse.
+    :return: A list of datetimes (in the timezone found, so the UTC offset is
+             available), with a `ParseFailure` in place of any input that
+             could not be parsed.
+    '''
+    dates = list(dates)
+    (us_date_parser, us_tz_factory), (eu_date_parser, eu_tz_factory) = best_guess_parsers()
+    results = [result and result[0] for result in us_date_parser.parse_many(dates, tz_factory=us_tz_factory, unsafe=True)]
+    retry = [i for i, result in enumerate(results) if not result]
+    for i, result in izip(retry, eu_date_parser.parse_many([dates[i] for i in retry], tz_factory=eu_tz_factory, unsafe=True)):
+        results[i] = result and result[0]
+    return results
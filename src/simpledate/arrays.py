@@ -0,0 +1,536 @@
+
+u'''
+Many dates as NumPy arrays: parse directly to arrays, without constructing a
+`SimpleDate` (or aware datetime) for each, and work with the results as
+columns (`SimpleDateArray`).  NumPy is required for this module only (the
+rest of the package does not use it).
+'''
+
+from collections import namedtuple
+from itertools import imap
+import datetime as dt
+
+import numpy as np
+
+from pytz import utc, timezone
+from pytz.tzinfo import DstTzInfo
+from simpledate import DEFAULT_DATE_PARSER, DEFAULT_TZ_FACTORY, SimpleDate, SimpleDateError, tzinfo_timeline, \
+    tzinfo_localize, wall_seconds, datetime_epoch_us, auto_invert, formatter, write_format
+from simpledate.utils import NamedOffset
+
+
+# the value of NaT as an integer, used for inputs that could not be parsed.
+NAT = np.iinfo(np.int64).min
+EPOCH = dt.datetime(1970, 1, 1)
+MICROS, DAY_MICROS = 1000000, 86400000000
+
+
+class ParsedArrays(namedtuple(u'ParsedArrays', u'instants offsets zones formats zone_table format_table')):
+    u'''
+    The result of `parse_array`: `instants` (UTC, datetime64[us]), `offsets`
+    (UTC offset in seconds, int32), `zones` and `formats` (int32 indices into
+    `zone_table` and `format_table`, which hold the tzinfo and write format
+    for each).  Inputs that could not be parsed have instant NaT, offset 0
+    and zone and format -1.
+    '''
+
+    __slots__ = ()
+
+
+class Interned(object):
+    u'''
+    Assign small integer ids to values, in order of first appearance.
+    '''
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def __call__(self, key, value=None):
+        u'''
+        :param key: The value to intern (or a key that identifies it).
+        :param value: The value to store, if not the key itself.
+        :return: The id for the key.
+        '''
+        try:
+            return self.ids[key]
+        except KeyError:
+            self.ids[key] = len(self.values)
+            self.values.append(key if value is None else value)
+            return self.ids[key]
+
+
+def instant(datetime, tzinfo, is_dst):
+    u'''
+    :param datetime: A naive datetime.
+    :param tzinfo: The timezone for the datetime.
+    :param is_dst: Used to resolve ambiguous and non-existent times.
+    :return: The (UTC epoch microseconds, UTC offset seconds, zone key) for
+             the datetime in the zone.  For pytz zones the key is the zone;
+             otherwise (for zones that hold only at the given instant) it is
+             the (offset, name) pair.
+    '''
+    timeline = tzinfo_timeline(tzinfo)
+    if timeline is not None:
+        offset = timeline.offsets[timeline.local_index(wall_seconds(datetime), is_dst)]
+        zone = tzinfo
+    else:
+        aware = tzinfo_localize(tzinfo, datetime, is_dst)
+        delta = aware.utcoffset()
+        offset = delta.days * 86400 + delta.seconds
+        zone = (offset, aware.tzinfo.tzname(aware))
+    return (wall_seconds(datetime) - offset) * 1000000 + datetime.microsecond, offset, zone
+
+
+def parse_array(dates, tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False,
+                date_parser=DEFAULT_DATE_PARSER):
+    u'''
+    Parse a sequence of strings, as `SimpleDateParser.parse_many`, to NumPy
+    arrays.
+
+    :param dates: The date strings to parse.
+    :param tz: A time zone to use if none available in the date (`None` is
+               local).
+    :param is_dst: Is the date known to be summertime?  (`None` is
+                   'unknown').
+    :param country: A country code (or list of codes) to restrict the
+                    choice of timezone.
+    :param tz_factory: Converts from the timezone text, offset, etc, to a
+                       `dt.tzinfo` instance (must be a PyTzFactory).
+    :param unsafe: Take the first timezone found.
+    :param date_parser: The parser to use.
+    :return: A `ParsedArrays` instance.
+    '''
+    zones, formats = Interned(), Interned()
+
+    def result(datetime, tzinfo, write_fmt):
+        micros, offset, zone = instant(datetime, tzinfo, is_dst)
+        if isinstance(zone, tuple):
+            zone_id = zones(zone, NamedOffset(dt.timedelta(seconds=zone[0]), zone[1]))
+        else:
+            zone_id = zones(zone)
+        return micros, offset, zone_id, formats(write_fmt)
+
+    columns = ([], [], [], [])
+    for row in date_parser._parse_many(dates, result, tz, is_dst, country, tz_factory, unsafe):
+        for column, value in zip(columns, row or (NAT, 0, -1, -1)):
+            column.append(value)
+    instants, offsets, zone_ids, format_ids = columns
+    return ParsedArrays(np.array(instants, dtype=np.int64).view(u'datetime64[us]'),
+                        np.array(offsets, dtype=np.int32),
+                        np.array(zone_ids, dtype=np.int32),
+                        np.array(format_ids, dtype=np.int32),
+                        zones.values, formats.values)
+
+
+def fixed_zone(offset, name):
+    u'''
+    :param offset: The UTC offset, in seconds.
+    :param name: The name of the zone.
+    :return: A zone with the given offset at all times.
+    '''
+    return NamedOffset(dt.timedelta(seconds=offset), name)
+
+
+def zone_offsets(tzinfo, instants):
+    u'''
+    :param tzinfo: A pytz timezone, or one with a fixed offset.
+    :param instants: UTC epoch microseconds (int64).
+    :return: The UTC offset of the zone at each instant, in seconds (int32).
+    '''
+    timeline = tzinfo_timeline(tzinfo)
+    if timeline is None:
+        delta = tzinfo.utcoffset(None)
+        return np.full(len(instants), delta.days * 86400 + delta.seconds, dtype=np.int32)
+    # a single binary search per instant, over the (shared) transition array.
+    transitions = np.frombuffer(timeline.transitions, dtype=np.float64)
+    offsets = np.frombuffer(timeline.offsets, dtype=np.dtype(u'l')).astype(np.int32)
+    index = np.searchsorted(transitions, instants // MICROS, side=u'right') - 1
+    return offsets[np.maximum(index, 0)]
+
+
+def resolve_zone(tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False):
+    u'''
+    Find a single zone to use for many instants.  Because there is no single
+    date, `tz` should be a tzinfo or the name of a zone (not an abbreviation
+    like EST).
+
+    :return: A pytz zone, or a zone with a fixed offset.
+    '''
+    if not isinstance(tz, dt.tzinfo):
+        zones = () if tz is None else (tz,)
+        tz = tz_factory.search(*zones, datetime=None, is_dst=is_dst, country=country, unsafe=unsafe)
+    if tzinfo_timeline(tz) is None:
+        try:
+            tz.utcoffset(None)
+        except Exception:
+            raise SimpleDateError(u'Cannot use {0} for many instants (not a fixed offset or pytz zone)', tz)
+    return tz
+
+
+def civil(days):
+    u'''
+    :param days: Days since the epoch (int64).
+    :return: The (year, month, day) for each (from Howard Hinnant's
+             `civil_from_days`, using only integer arithmetic).
+    '''
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    return yoe + era * 400 + (month <= 2), month, day
+
+
+class LocalTimes(namedtuple(u'LocalTimes', u'year month day hour minute second microsecond weekday offsets')):
+    u'''
+    The result of `to_local`: wall-clock fields (int64 arrays, with weekday
+    as `dt.datetime.weekday`) and UTC offsets (seconds, int32).
+    '''
+
+    __slots__ = ()
+
+
+def wall_fields(local, offsets):
+    u'''
+    :param local: Wall-clock times, in epoch microseconds (int64).
+    :param offsets: The UTC offsets.
+    :return: The `LocalTimes` for the times.
+    '''
+    days, micros = local // DAY_MICROS, local % DAY_MICROS
+    year, month, day = civil(days)
+    # 1970-01-01 was a thursday
+    return LocalTimes(year, month, day, micros // (3600 * MICROS), micros % (3600 * MICROS) // (60 * MICROS),
+                      micros % (60 * MICROS) // MICROS, micros % MICROS, (days + 3) % 7, offsets)
+
+
+def to_local(instants, tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False):
+    u'''
+    Convert many UTC instants to wall-clock fields in a single zone (as
+    `SimpleDate.convert`, but for whole arrays).
+
+    :param instants: UTC instants (datetime64, or int64 epoch microseconds).
+    :param tz: The zone (see `resolve_zone`; `None` is local).
+    :param is_dst: Passed to the timezone search.
+    :param country: A country code (or list of codes) to restrict the
+                    choice of timezone.
+    :param tz_factory: Converts from the timezone text to a `dt.tzinfo`.
+    :param unsafe: Take the first timezone found.
+    :return: The `LocalTimes` for the instants.
+    '''
+    instants = np.asarray(instants)
+    if instants.dtype.kind == u'M':
+        instants = instants.astype(u'datetime64[us]')
+    instants = instants.view(np.int64)
+    offsets = zone_offsets(resolve_zone(tz, is_dst, country, tz_factory, unsafe), instants)
+    return wall_fields(instants + offsets.astype(np.int64) * MICROS, offsets)
+
+
+def offset_name(tzinfo, offset, seconds):
+    u'''
+    :param tzinfo: A pytz timezone.
+    :param offset: A UTC offset used by the zone, in seconds.
+    :param seconds: A UTC instant, in epoch seconds.
+    :return: The name of the zone in the closest period (before or after the
+             instant) with that offset (or `None` if there is none).
+    '''
+    timeline = tzinfo_timeline(tzinfo)
+    current = timeline.utc_index(seconds)
+    periods = [index for index in xrange(len(timeline.offsets)) if timeline.offsets[index] == offset]
+    if periods:
+        return timeline.names[min(periods, key=lambda index: (abs(index - current), -index))]
+
+
+class SimpleDateArray(object):
+    u'''
+    Many dates, stored as columns: the UTC instant (microseconds since the
+    epoch), UTC offset (seconds) and ids for the timezone and write format,
+    which are indices into tables shared by all dates.  The usual
+    `SimpleDate` attributes and operations apply to all values at once.
+
+    Missing values (inputs that could not be parsed) have zone and format
+    -1; they give NaT instants, -1 for fields, `None` when indexed, and never
+    compare as equal.
+    '''
+
+    def __init__(self, instants, offsets, zones, zone_table, formats, format_table):
+        u'''
+        :param instants: UTC epoch microseconds (int64 or datetime64[us]).
+        :param offsets: UTC offsets, in seconds (int32).
+        :param zones: Indices into `zone_table` (int32).
+        :param zone_table: Timezones (pytz zones or fixed offsets).
+        :param formats: Indices into `format_table` (int32).
+        :param format_table: Write formats.
+        '''
+        self.__instants = np.asarray(instants).view(np.int64)
+        self.__offsets = np.asarray(offsets, dtype=np.int32)
+        self.__zones = np.asarray(zones, dtype=np.int32)
+        self.__zone_table = list(zone_table)
+        self.__formats = np.asarray(formats, dtype=np.int32)
+        self.__format_table = list(format_table)
+
+    @staticmethod
+    def parse(dates, tz=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False,
+              date_parser=DEFAULT_DATE_PARSER):
+        u'''
+        Parse a sequence of strings (see `parse_array`).
+
+        :return: A new array (with missing values for failures).
+        '''
+        parsed = parse_array(dates, tz=tz, is_dst=is_dst, country=country, tz_factory=tz_factory, unsafe=unsafe,
+                             date_parser=date_parser)
+        return SimpleDateArray(parsed.instants, parsed.offsets, parsed.zones, parsed.zone_table,
+                               parsed.formats, parsed.format_table)
+
+    @staticmethod
+    def from_dates(dates):
+        u'''
+        :param dates: `SimpleDate` instances (or `None` for missing values).
+        :return: A new array.
+        '''
+        zones, formats = Interned(), Interned()
+        columns = ([], [], [], [])
+        for date in dates:
+            if date is None:
+                row = NAT, 0, -1, -1
+            else:
+                datetime = date.datetime
+                delta = datetime.utcoffset()
+                offset = delta.days * 86400 + delta.seconds
+                if isinstance(datetime.tzinfo, DstTzInfo):
+                    zone = zones(datetime.tzinfo.zone, timezone(datetime.tzinfo.zone))
+                elif tzinfo_timeline(datetime.tzinfo) is not None:
+                    zone = zones(datetime.tzinfo)
+                else:
+                    name = datetime.tzinfo.tzname(datetime)
+                    zone = zones((offset, name), fixed_zone(offset, name))
+                row = datetime_epoch_us(datetime), offset, zone, formats(date.format)
+            for column, value in zip(columns, row):
+                column.append(value)
+        instants, offsets, zone_ids, format_ids = columns
+        return SimpleDateArray(np.array(instants, dtype=np.int64), offsets, zone_ids, zones.values,
+                               format_ids, formats.values)
+
+    def __len__(self):
+        return len(self.__instants)
+
+    @property
+    def instants(self):
+        u'''
+        The UTC instants (datetime64[us]).
+        '''
+        return self.__instants.view(u'datetime64[us]')
+
+    @property
+    def offsets(self):
+        return self.__offsets
+
+    @property
+    def zones(self):
+        return self.__zones
+
+    @property
+    def zone_table(self):
+        return self.__zone_table
+
+    @property
+    def formats(self):
+        return self.__formats
+
+    @property
+    def format_table(self):
+        return self.__format_table
+
+    @property
+    def valid(self):
+        u'''
+        True where a value is present.
+        '''
+        return self.__zones >= 0
+
+    def __local(self):
+        u'''
+        :return: The wall-clock times, in epoch microseconds.
+        '''
+        return self.__instants + self.__offsets.astype(np.int64) * MICROS
+
+    def __field(self, values):
+        return np.where(self.valid, values, -1)
+
+    @property
+    def local(self):
+        u'''
+        The wall-clock fields (`LocalTimes`), with -1 for missing values.
+        '''
+        fields = wall_fields(self.__local(), self.__offsets)
+        return LocalTimes(*(tuple(imap(self.__field, fields[:-1])) + (fields[-1],)))
+
+    @property
+    def year(self):
+        return self.__field(civil(self.__local() // DAY_MICROS)[0])
+
+    @property
+    def month(self):
+        return self.__field(civil(self.__local() // DAY_MICROS)[1])
+
+    @property
+    def day(self):
+        return self.__field(civil(self.__local() // DAY_MICROS)[2])
+
+    @property
+    def weekday(self):
+        # 1970-01-01 was a thursday
+        return self.__field((self.__local() // DAY_MICROS + 3) % 7)
+
+    @property
+    def isoweekday(self):
+        return self.__field(self.weekday + 1)
+
+    @property
+    def hour(self):
+        return self.__field(self.__local() % DAY_MICROS // (3600 * MICROS))
+
+    @property
+    def minute(self):
+        return self.__field(self.__local() % (3600 * MICROS) // (60 * MICROS))
+
+    @property
+    def second(self):
+        return self.__field(self.__local() % (60 * MICROS) // MICROS)
+
+    @property
+    def microsecond(self):
+        return self.__field(self.__local() % MICROS)
+
+    @property
+    def timestamp(self):
+        return np.where(self.valid, self.__instants / 1e6, np.nan)
+
+    def __getitem__(self, index):
+        u'''
+        :param index: An integer (giving a `SimpleDate`, or `None` if missing),
+                      or a slice, boolean mask or array of indices (giving a
+                      new array).
+        '''
+        if isinstance(index, (int, long, np.integer)):
+            zone = self.__zones[index]
+            if zone < 0: return None
+            tzinfo = self.__zone_table[zone]
+            offset = int(self.__offsets[index])
+            utc_datetime = EPOCH + dt.timedelta(microseconds=int(self.__instants[index]))
+            datetime = utc.localize(utc_datetime).astimezone(tzinfo)
+            if datetime.utcoffset() != dt.timedelta(seconds=offset):
+                # after adding a timedelta the offset need not be normal for
+                # the zone (as with datetime arithmetic).
+                name = offset_name(tzinfo, offset, int(self.__instants[index]) // MICROS)
+                datetime = utc.localize(utc_datetime).astimezone(fixed_zone(offset, name))
+            return SimpleDate.from_aware(datetime, self.__format_table[self.__formats[index]])
+        else:
+            return SimpleDateArray(self.__instants[index], self.__offsets[index], self.__zones[index], self.__zone_table,
+                                   self.__formats[index], self.__format_table)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return u'{0}({1!r})'.format(self.__class__.__name__, [None if date is None else unicode(date) for date in self])
+
+    def strftime(self, format):
+        u'''
+        :return: A list of strings (`None` for missing values).
+        '''
+        write = formatter(auto_invert(format))
+        return [None if date is None else write(date.datetime) for date in self]
+
+    def __compare(self, other, compare):
+        if isinstance(other, SimpleDateArray):
+            other = other.instants
+        elif isinstance(other, SimpleDate):
+            other = np.datetime64(datetime_epoch_us(other.datetime), u'us')
+        elif isinstance(other, dt.datetime) and other.tzinfo is not None:
+            other = np.datetime64(datetime_epoch_us(other), u'us')
+        else:
+            return NotImplemented
+        return compare(self.instants, other)
+
+    def __eq__(self, other): return self.__compare(other, np.equal)
+    def __ne__(self, other): return self.__compare(other, np.not_equal)
+    def __lt__(self, other): return self.__compare(other, np.less)
+    def __le__(self, other): return self.__compare(other, np.less_equal)
+    def __gt__(self, other): return self.__compare(other, np.greater)
+    def __ge__(self, other): return self.__compare(other, np.greater_equal)
+
+    __hash__ = None
+
+    def argsort(self):
+        u'''
+        :return: The indices that sort the array by instant (missing values
+                 last).
+        '''
+        return np.argsort(np.where(self.valid, self.__instants, np.iinfo(np.int64).max), kind=u'mergesort')
+
+    def sorted(self):
+        u'''
+        :return: A new array, sorted by instant (missing values last).
+        '''
+        return self[self.argsort()]
+
+    def __shift(self, micros):
+        instants = np.where(self.valid, self.__instants + micros, NAT)
+        # as with datetime arithmetic, the offset is unchanged.
+        return SimpleDateArray(instants, self.__offsets, self.__zones, self.__zone_table,
+                               self.__formats, self.__format_table)
+
+    def __add__(self, other):
+        if isinstance(other, dt.timedelta):
+            return self.__shift((other.days * 86400 + other.seconds) * MICROS + other.microseconds)
+        else:
+            return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if isinstance(other, dt.timedelta):
+            return self + -other
+        elif isinstance(other, SimpleDateArray):
+            return self.instants - other.instants
+        else:
+            return NotImplemented
+
+    def convert(self, tz=None, format=None, is_dst=False, country=None, tz_factory=DEFAULT_TZ_FACTORY, unsafe=False):
+        u'''
+        Convert all values to a single timezone (see `SimpleDate.convert`
+        and `resolve_zone`).
+
+        :return: A new array.
+        '''
+        if tz is None and country is None:
+            instants, offsets, zones, zone_table = self.__instants, self.__normal_offsets(), self.__zones, self.__zone_table
+        else:
+            tz = resolve_zone(tz, is_dst, country, tz_factory, unsafe)
+            instants, zones, zone_table = self.__instants, np.where(self.valid, 0, -1), [tz]
+            offsets = np.where(self.valid, zone_offsets(tz, instants), 0)
+        if format is None:
+            formats, format_table = self.__formats, self.__format_table
+        else:
+            formats, format_table = np.where(self.valid, 0, -1), [write_format(format)]
+        return SimpleDateArray(instants, offsets, zones, zone_table, formats, format_table)
+
+    def __normal_offsets(self):
+        u'''
+        :return: The offsets of each zone at each instant.
+        '''
+        offsets = np.zeros(len(self), dtype=np.int32)
+        for zone, tzinfo in enumerate(self.__zone_table):
+            selected = self.__zones == zone
+            if selected.any():
+                offsets[selected] = zone_offsets(tzinfo, self.__instants[selected])
+        return offsets
+
+    @property
+    def utc(self):
+        return self.convert(utc)
@@ -0,0 +1,119 @@
+
+from unittest import TestCase
+import datetime as dt
+import numpy as np
+from simpledate import SimpleDate, SimpleDateParser, PyTzFactory, datetime_epoch_us
+from pytz import timezone, utc
+from random import Random
+from simpledate.arrays import parse_array, SimpleDateArray, to_local
+
+
+class ParseArrayTest(TestCase):
+
+    def test_parse_array(self):
+        dates = [u'2013-06-08 12:34:56 America/New_York', u'not a date', u'2013-01-08 12:34:56.5 America/New_York',
+                 u'2013-06-08 12:34 Europe/London', u'2013-11-03 01:30 America/New_York']
+        parser, tz_factory = SimpleDateParser(), PyTzFactory()
+        result = parse_array(dates, date_parser=parser, tz_factory=tz_factory)
+        assert result.instants.dtype == np.dtype(u'datetime64[us]'), result.instants.dtype
+        assert result.offsets.dtype == np.int32, result.offsets.dtype
+        for date, expected, instant, offset, zone, format in zip(dates, parser.parse_many(dates, tz_factory=tz_factory),
+                                                                  result.instants, result.offsets, result.zones, result.formats):
+            if expected:
+                datetime, write_fmt = expected
+                assert instant.astype(np.int64) == datetime_epoch_us(datetime), (date, instant)
+                assert offset == datetime.utcoffset().total_seconds(), (date, offset)
+                assert result.zone_table[zone].zone == datetime.tzinfo.zone, (date, result.zone_table[zone])
+                assert result.format_table[format] == write_fmt, (date, result.format_table[format])
+            else:
+                assert np.isnat(instant), instant
+                assert zone == -1 and format == -1, (zone, format)
+        # zones and formats are shared
+        assert result.zones[0] == result.zones[2] == result.zones[4] != result.zones[3], result.zones
+        assert len(result.zone_table) == 2, result.zone_table
+
+    def test_fixed_zones(self):
+        # abbreviations and offsets give zones with a fixed offset and name.
+        dates = [u'2013-06-08 12:34:56 EDT', u'2013-06-09 12:34:56 EDT', u'2013-06-08 12:34:56 +0100']
+        parser, tz_factory = SimpleDateParser(), PyTzFactory()
+        result = parse_array(dates, date_parser=parser, tz_factory=tz_factory)
+        for date, (datetime, _), instant, offset, zone in zip(dates, parser.parse_many(dates, tz_factory=tz_factory),
+                                                              result.instants, result.offsets, result.zones):
+            assert instant.astype(np.int64) == datetime_epoch_us(datetime), (date, instant)
+            assert offset == datetime.utcoffset().total_seconds(), (date, offset)
+            tzinfo = result.zone_table[zone]
+            assert tzinfo.utcoffset(None) == datetime.utcoffset(), (date, tzinfo)
+            assert tzinfo.tzname(None) == datetime.tzname(), (date, tzinfo)
+        assert result.zones[0] == result.zones[1] != result.zones[2], result.zones
+
+
+class SimpleDateArrayTest(TestCase):
+
+    DATES = [u'2013-06-08 12:34:56.5 America/New_York', u'not a date', u'2013-11-03 01:30 America/New_York',
+             u'2013-01-08 12:34 Europe/London', u'1969-12-31 23:59:59.999999 Etc/UTC', u'1920-02-28 23:00 Asia/Tokyo']
+
+    def assert_dates(self, array, dates):
+        assert len(array) == len(dates), array
+        for name in (u'year', u'month', u'day', u'weekday', u'hour', u'minute', u'second', u'microsecond'):
+            expected = [-1 if date is None else getattr(date, name) for date in dates]
+            assert list(getattr(array, name)) == expected, (name, getattr(array, name), expected)
+        for result, date in zip(array, dates):
+            assert result == date or result is date, (result, date)
+            if date is not None:
+                assert unicode(result) == unicode(date), (result, date)
+
+    def test_fields(self):
+        dates = [None if date == u'not a date' else SimpleDate(date) for date in self.DATES]
+        array = SimpleDateArray.parse(self.DATES)
+        self.assert_dates(array, dates)
+        self.assert_dates(SimpleDateArray.from_dates(dates), dates)
+        assert list(array.valid) == [date is not None for date in dates], array.valid
+
+    def test_fixed_zones(self):
+        dates = [SimpleDate(u'2013-06-08 12:34:56 EDT'), None, SimpleDate(u'2013-06-08 12:34:56 +0100')]
+        array = SimpleDateArray.from_dates(dates)
+        self.assert_dates(array, dates)
+        delta = dt.timedelta(days=1, hours=1)
+        self.assert_dates(array + delta, [None if date is None else date + delta for date in dates])
+
+    def test_operations(self):
+        dates = [None if date == u'not a date' else SimpleDate(date) for date in self.DATES]
+        array = SimpleDateArray.parse(self.DATES)
+        delta = dt.timedelta(days=200, microseconds=3)
+        self.assert_dates(array + delta, [None if date is None else date + delta for date in dates])
+        self.assert_dates(array - delta, [None if date is None else date - delta for date in dates])
+        self.assert_dates(array.convert(u'Europe/London'),
+                          [None if date is None else date.convert(u'Europe/London') for date in dates])
+        self.assert_dates(array.utc, [None if date is None else date.utc for date in dates])
+        assert list(array < dates[2]) == [True, False, False, True, True, True], array < dates[2]
+        assert list(array == array) == [True, False, True, True, True, True], array == array
+        self.assert_dates(array.sorted(), sorted(date for date in dates if date) + [None])
+        self.assert_dates(array[array.valid][1:3], dates[2:4])
+        assert array.strftime(u'Y-m-d') == [None if date is None else date.strftime(u'Y-m-d') for date in dates]
+
+    def test_convert_format(self):
+        dates = [None if date == u'not a date' else SimpleDate(date) for date in self.DATES]
+        array = SimpleDateArray.parse(self.DATES)
+        for format in (u'Y-m-d', u'%Y-%m-%d %H:%M', (u'Y-m-d H:M', u'Y-m-d')):
+            self.assert_dates(array.convert(format=format),
+                              [None if date is None else date.convert(format=format) for date in dates])
+            self.assert_dates(array.convert(u'Asia/Tokyo', format=format),
+                              [None if date is None else date.convert(u'Asia/Tokyo', format=format) for date in dates])
+        assert unicode(array.convert(format=u'Y-m-d')[0]) == u'2013-06-08', array.convert(format=u'Y-m-d')[0]
+
+
+class ToLocalTest(TestCase):
+
+    def test_to_local(self):
+        random = Random(0)
+        instants = np.array([random.randint(-2**35, 2**35) * 1000003 for _ in range(1000)], dtype=np.int64)
+        for name in (u'America/New_York', u'Europe/London', u'Australia/Lord_Howe', u'UTC'):
+            tz = timezone(name)
+            local = to_local(instants, name)
+            for index, instant in enumerate(instants):
+                datetime = utc.localize(dt.datetime(1970, 1, 1) + dt.timedelta(microseconds=int(instant))).astimezone(tz)
+                expected = (datetime.year, datetime.month, datetime.day, datetime.hour, datetime.minute, datetime.second,
+                            datetime.microsecond, datetime.weekday(), datetime.utcoffset().total_seconds())
+                assert tuple(field[index] for field in local) == expected, (name, datetime, local)
+        local = to_local(np.array([u'2013-06-08T12:00'], dtype=u'datetime64[m]'), u'America/New_York')
+        assert (local.hour[0], local.offsets[0]) == (8, -14400), local
@@ -0,0 +1,243 @@
+
+u'''
+Simple benchmarks.  Run with
+
+  python -m simpledate.bench [name...]
+
+where the names select benchmarks (by default, all are run).
+'''
+
+from __future__ import division
+from os import environ, pathsep
+from os.path import dirname, abspath
+from subprocess import check_output
+from tempfile import NamedTemporaryFile
+from time import time
+import sys
+
+
+STARTUP = u'''
+from time import time
+start = time()
+import simpledate
+imported = time()
+simpledate.SimpleDate(%r)
+parsed = time()
+print imported - start, parsed - imported
+'''
+
+SAVE = u'''
+import simpledate, simpledate.fmt
+simpledate.SimpleDate(%r)
+simpledate.fmt.save_format_cache(%r)
+'''
+
+def startup(date=u'2013-06-08 12:34:56 EDT', repeat=5, cache=None):
+    u'''
+    Time importing the package and then the first parse (which is when the
+    default parser and timezone factory are built), each in a new
+    interpreter.
+
+    :param date: The date to parse.
+    :param repeat: The number of interpreters to start.
+    :param cache: If given, a file for the format cache (written first, by
+                  another interpreter, and then used by all).
+    :return: The best (import, first parse) times, in seconds.
+    '''
+    env = dict(environ)
+    env[u'PYTHONPATH'] = pathsep.join([dirname(dirname(abspath(__file__)))] +
+                                      [path for path in [environ.get(u'PYTHONPATH')] if path])
+    if cache:
+        check_output([sys.executable, u'-c', SAVE % (date, cache)], env=env)
+        env[u'SIMPLEDATE_FORMAT_CACHE'] = cache
+    times = []
+    for _ in xrange(repeat):
+        output = check_output([sys.executable, u'-c', STARTUP % date], env=env)
+        times.append(tuple(float(value) for value in output.split()[-2:]))
+    return min(imported for imported, _ in times), min(parsed for _, parsed in times)
+
+
+def report_startup():
+    imported, parsed = startup()
+    print u'startup: import {0:.1f} ms, first parse {1:.1f} ms'.format(imported * 1000, parsed * 1000)
+    with NamedTemporaryFile(suffix=u'.json') as cache:
+        imported, parsed = startup(cache=cache.name)
+    print u'startup (format cache): import {0:.1f} ms, first parse {1:.1f} ms'.format(imported * 1000, parsed * 1000)
+
+
+MIXED = [u'2013-06-08 12:34:56 EDT', u'Tue, 18 Jun 2013 12:19:09 -0400', u'130706062100Z',
+         u'20130706062100Z', u'May 25 23:59:59 2012 GMT', u'2013-06-08', u'not a date']
+
+def best(function, repeat=5):
+    u'''
+    :param function: A thunk to time.
+    :param repeat: The number of times to call the thunk.
+    :return: The shortest time taken, in seconds.
+    '''
+    times = []
+    for _ in xrange(repeat):
+        start = time()
+        function()
+        times.append(time() - start)
+    return min(times)
+
+
+def formats(dates=MIXED, count=2000):
+    u'''
+    Time matching mixed input against the default formats, first by trying
+    each format in turn with `strptime` (as the parser used to), then with
+    the combined regexps, and finally with the combined regexps for only
+    those formats that match the shape of the input.
+
+    :param dates: The input strings (repeated as necessary).
+    :param count: The number of strings to match.
+    :return: The (sequential, combined, shaped) times per string, in seconds.
+    '''
+    from simpledate import DEFAULT_FORMATS
+    from simpledate.fmt import strptime, matches, auto_invert, ShapeIndex
+    formats = tuple(auto_invert(format) for format in DEFAULT_FORMATS)
+    dates = [dates[i % len(dates)] for i in xrange(count)]
+    def sequential():
+        for date in dates:
+            for format in formats:
+                try:
+                    strptime(date, format)
+                    break
+                except ValueError:
+                    pass
+    def combined():
+        for date in dates:
+            for _, rebuild, convert, found in matches(date, formats):
+                convert(found), rebuild(found)
+                break
+    shapes = ShapeIndex(formats)
+    def shaped():
+        for date in dates:
+            for _, rebuild, convert, found in matches(date, shapes.candidates(date)):
+                convert(found), rebuild(found)
+                break
+    sequential(), combined(), shaped()  # warm caches
+    return best(sequential) / count, best(combined) / count, best(shaped) / count
+
+
+def report_formats():
+    sequential, combined, shaped = formats()
+    print u'formats: sequential {0:.1f} us, combined {1:.1f} us, shaped {2:.1f} us'.format(
+        sequential * 1e6, combined * 1e6, shaped * 1e6)
+
+
+def strptime(count=20000):
+    u'''
+    Time `fmt.strptime` on ISO 8601 and RFC 2822 input (with the format
+    already compiled and cached), and then just the conversion of the
+    matched groups, both with the format's compiled converter (after) and
+    with the generic `to_time_tuple` (before - it handles any groups, and
+    always finds the julian day and weekday).
+
+    :param count: The number of calls to time.
+    :return: The (ISO, RFC) times per call, in seconds, each as a tuple of
+             (strptime, compiled converter, generic conversion).
+    '''
+    from simpledate import ISO_8601, RFC_2822
+    from simpledate.fmt import strptime, auto_invert, to_regexp, to_time_tuple
+    def best_per_call(function):
+        function()  # warm caches
+        return best(function) / count
+    def timer(date, format):
+        format = auto_invert(format)
+        compiled = to_regexp(format)
+        found = compiled.regexp.match(date).groupdict()
+        converter = compiled.converter
+        def parse():
+            for _ in xrange(count):
+                strptime(date, format)
+        def convert():
+            for _ in xrange(count):
+                converter(found, False)
+        def generic():
+            for _ in xrange(count):
+                to_time_tuple(found)
+        return best_per_call(parse), best_per_call(convert), best_per_call(generic)
+    return timer(u'2013-06-08 12:34:56.123 EDT', ISO_8601[0]), timer(u'Tue, 18 Jun 2013 12:19:09 -0400', RFC_2822[0])
+
+
+def report_strptime():
+    for name, (parse, convert, generic) in zip((u'ISO', u'RFC 2822'), strptime()):
+        print u'strptime: {0} {1:.1f} us (groups: compiled converter {2:.1f} us, generic {3:.1f} us)'.format(
+            name, parse * 1e6, convert * 1e6, generic * 1e6)
+
+
+ISO = [u'2013-06-08 12:34:56.123 EDT', u'2013-06-08T12:34:56Z', u'2013-06-08 12:34:56 +0100']
+
+# Date: headers as found in mail archives (the last few are not in the
+# usual layout, or are not accepted at all, so use the regexp).
+HEADERS = [u'Tue, 18 Jun 2013 12:19:09 -0400', u'Mon, 3 Jun 2013 08:02:51 +0000', u'Fri, 07 Jun 2013 23:59:59 +0200',
+           u'Wed, 5 Jun 2013 17:14:10 GMT', u'Thu, 13 Feb 1969 23:32:54 -0330', u'Sat, 01 Jun 2013 11:00:00 EST',
+           u'Sun, 2 Jun 2013 10:11:12 +05:30', u'Tue, 18 Jun 2013 12:19 EDT', u'Tue, 18 Jun 2013 12:19:09 -0400 (EDT)',
+           u'18 Jun 2013 12:19:09 -0400', u'Tue,  18 Jun 2013 12:19:09 -0400', u'Tue, 18 Jun 2013 12:19:09 UT']
+
+def fast_path(format, dates, count=20000):
+    u'''
+    Time `fmt.strptime` with the hand-written parser for a format and then
+    with the regexp alone (failures are included).
+
+    :param format: The format (as registered).
+    :param dates: The input strings (repeated as necessary).
+    :param count: The number of calls to time.
+    :return: The (fast, regexp) times per call, in seconds.
+    '''
+    from simpledate.fmt import strptime, FAST_PATHS
+    dates = [dates[i % len(dates)] for i in xrange(count)]
+    def run():
+        for date in dates:
+            try:
+                strptime(date, format)
+            except ValueError:
+                pass
+    run()  # warm caches
+    fast = best(run) / count
+    parser = FAST_PATHS.pop(format)
+    try:
+        run()
+        regexp = best(run) / count
+    finally:
+        FAST_PATHS[format] = parser
+    return fast, regexp
+
+
+def report_fast_paths():
+    from simpledate import ISO_8601, RFC_2822
+    from simpledate.fmt import auto_invert
+    for name, format, dates in ((u'ISO', ISO_8601[0], ISO), (u'RFC 2822', auto_invert(RFC_2822[0]), HEADERS)):
+        fast, regexp = fast_path(format, dates)
+        print u'fast paths: {0} fast {1:.1f} us, regexp {2:.1f} us'.format(name, fast * 1e6, regexp * 1e6)
+
+
+def writing(count=20000):
+    u'''
+    Time formatting dates (in their parsed formats) with `strftime` and then
+    with `format_many`.
+
+    :param count: The number of dates to format.
+    :return: The (strftime, format_many) times per date, in seconds.
+    '''
+    from simpledate import SimpleDate, format_many
+    dates = [SimpleDate(date) for date in ISO[:1] + [u'2013-06-08 12:34:56', u'2013-06-08']]
+    dates = [dates[i % len(dates)] for i in xrange(count)]
+    strftime = best(lambda: [date.datetime.strftime(date.format) for date in dates]) / count
+    many = best(lambda: format_many(dates)) / count
+    return strftime, many
+
+
+def report_writing():
+    strftime, many = writing()
+    print u'writing: strftime {0:.1f} us, format_many {1:.1f} us'.format(strftime * 1e6, many * 1e6)
+
+
+BENCHMARKS = {u'startup': report_startup, u'formats': report_formats, u'strptime': report_strptime,
+              u'fast': report_fast_paths, u'writing': report_writing}
+
+
+if __name__ == u'__main__':
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        BENCHMARKS[name]()
@@ -0,0 +1,151 @@
+
+u'''
+Parse large files of dates (one per line) using all available cores.  Run
+with
+
+  python -m simpledate.bulk [-p processes] [-c chunk] input [output]
+
+Each line of output is the UTC instant in microseconds since the Unix
+epoch, followed by the UTC offset in seconds, for the matching line of
+input (parsed as `best_guess_utc`).  Lines that cannot be parsed give empty
+lines of output.
+
+The input is split into byte ranges (ending at line breaks) that are parsed
+in separate processes, each of which reads its range through `mmap`.
+'''
+
+from __future__ import division
+from argparse import ArgumentParser
+from contextlib import closing
+from mmap import mmap, ACCESS_READ
+from multiprocessing import Pool
+from os.path import getsize
+from traceback import format_exc
+import sys
+
+from simpledate import best_guess_many, datetime_epoch_us
+
+
+# the approximate number of bytes parsed by each task.
+CHUNK_SIZE = 1 << 20
+
+
+def byte_ranges(path, chunk_size=CHUNK_SIZE):
+    u'''
+    Split a file into ranges of approximately `chunk_size` bytes, each
+    ending after a line break (or at the end of the file).
+
+    :param path: The file to split.
+    :param chunk_size: The approximate size of each range.
+    :return: A list of (start, end) byte offsets.
+    '''
+    size = getsize(path)
+    if not size: return []  # mmap cannot map an empty file
+    ranges, start = [], 0
+    with open(path, u'rb') as input:
+        with closing(mmap(input.fileno(), 0, access=ACCESS_READ)) as data:
+            while start < size:
+                end = data.find(b'\n', min(start + chunk_size, size) - 1)
+                end = size if end < 0 else end + 1
+                ranges.append((start, end))
+                start = end
+    return ranges
+
+
+def read_lines(path, start, end, encoding=u'utf8'):
+    u'''
+    :param path: The file to read.
+    :param start: The offset of the first byte.
+    :param end: The offset after the last byte.
+    :param encoding: The encoding of the file.
+    :return: The lines in the range, decoded and without line breaks.
+    '''
+    with open(path, u'rb') as input:
+        with closing(mmap(input.fileno(), 0, access=ACCESS_READ)) as data:
+            text = data[start:end].decode(encoding)
+    if text.endswith(u'\n'): text = text[:-1]
+    return [line.rstrip(u'\r') for line in text.split(u'\n')]
+
+
+def to_instant(datetime):
+    u'''
+    :param datetime: An aware datetime (or `ParseFailure`).
+    :return: The (UTC epoch microseconds, UTC offset seconds) pair, or
+             `None` for a failure.
+    '''
+    if not datetime: return None
+    offset = datetime.utcoffset()
+    return datetime_epoch_us(datetime), offset.days * 86400 + offset.seconds
+
+
+def parse_range(path, start, end, encoding=u'utf8'):
+    u'''
+    Parse the lines in a byte range of a file.
+
+    :param path: The file to read.
+    :param start: The offset of the first byte.
+    :param end: The offset after the last byte.
+    :param encoding: The encoding of the file.
+    :return: A list of (UTC epoch microseconds, UTC offset seconds) pairs, with
+             `None` in place of any line that could not be parsed.
+    '''
+    return [to_instant(datetime) for datetime in best_guess_many(read_lines(path, start, end, encoding))]
+
+
+def _parse_range(args):
+    u'''
+    `parse_range` for `Pool.imap` (which passes a single argument).  Errors
+    are returned to the caller as a `RuntimeError` with the original
+    traceback, since many exceptions (eg `PyTzFactoryError`) cannot be
+    unpickled, which leaves the pool waiting forever.
+    '''
+    try:
+        return parse_range(*args)
+    except Exception:
+        raise RuntimeError(b'Failed to parse bytes %d-%d of %r\n%s' % (args[1], args[2], args[0], format_exc()))
+
+
+def parse_file(path, processes=None, chunk_size=CHUNK_SIZE, encoding=u'utf8'):
+    u'''
+    Parse each line of a file, in parallel.  An error in a worker is raised
+    here as a `RuntimeError` (with the worker's traceback).
+
+    :param path: The file to read.
+    :param processes: The number of worker processes (`None` is the number of
+                      cores).
+    :param chunk_size: The approximate number of bytes parsed by each task.
+    :param encoding: The encoding of the file.
+    :return: A generator of (UTC epoch microseconds, UTC offset seconds)
+             pairs, in input order, with `None` in place of any line that could
+             not be parsed.
+    '''
+    ranges = byte_ranges(path, chunk_size)
+    if not ranges: return
+    pool = Pool(processes)
+    try:
+        for results in pool.imap(_parse_range, [(path, start, end, encoding) for start, end in ranges]):
+            for result in results: yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog=u'python -m simpledate.bulk',
+                            description=u'Parse dates (one per line) to UTC epoch microseconds and offset seconds.')
+    parser.add_argument(u'-p', u'--processes', type=int, default=None, help=u'number of processes (default all cores)')
+    parser.add_argument(u'-c', u'--chunk', type=int, default=CHUNK_SIZE, help=u'bytes per task (default %(default)s)')
+    parser.add_argument(u'-e', u'--encoding', default=u'utf8', help=u'input encoding (default %(default)s)')
+    parser.add_argument(u'input', help=u'input file')
+    parser.add_argument(u'output', nargs=u'?', help=u'output file (default stdout)')
+    args = parser.parse_args(argv)
+    output = open(args.output, u'w') if args.output else sys.stdout
+    try:
+        for result in parse_file(args.input, args.processes, args.chunk, args.encoding):
+            output.write(u'%d %d\n' % result if result else u'\n')
+    finally:
+        if args.output: output.close()
+
+
+if __name__ == u'__main__':
+    main()
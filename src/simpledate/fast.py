@@ -0,0 +1,204 @@
+
+u'''
+Hand-written parsers for common layouts, used in place of the regexp for a
+format (see `fmt.register_fast_path`).  Each parser handles only the usual
+layout of its input and returns `None` for anything else, so that the
+regexp (which is more flexible) is used instead.  The results are always
+the same as `fmt.strptime` with the format.
+'''
+
+from datetime import date
+
+from simpledate.fmt import _tz, locale_tables
+
+
+DIGITS = frozenset(u'0123456789')  # not isdigit(), which accepts other scripts
+LETTERS = frozenset(u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+NAME = LETTERS | frozenset(u'_')
+ASCII = frozenset(unichr(c) for c in range(33, 128))
+
+# fixed-width numbers, by lookup (faster than checking digits and int()).
+TWO_DIGITS = dict((u'%02d' % n, n) for n in range(100))
+FOUR_DIGITS = dict((u'%04d' % n, n) for n in range(10000))
+
+DATE_TIME = {u' ': u' %H:%M', u'T': u'T%H:%M'}
+
+_NAMES = {}
+
+def _names(name, allowed):
+    u'''
+    :param name: An attribute of `LocaleTime` (eg `a_month`).
+    :param allowed: The characters allowed in a name (others are left to
+                    the regexp, which only ignores the case of ASCII).
+    :return: A dict from name (lower, upper or title case) to index, for the
+             process locale (the first index if a name is repeated, as
+             `list.index`).
+    '''
+    try:
+        return _NAMES[name]
+    except KeyError:
+        table = {}
+        for index, value in reversed(list(enumerate(locale_tables().names(name)))):
+            if value and all(c in allowed for c in value):
+                for variant in (value.lower(), value.upper(), value.title()):
+                    table[variant] = index
+        _NAMES[name] = table
+        return table
+
+
+def _zone_name(name):
+    u'''
+    :return: Is the whole of `name` matched by the regexp for %!Z?
+    '''
+    if name in (u'Z', u'z'):
+        return True
+    parts = name.split(u'/')
+    if len(parts) == 1:
+        return len(name) >= 3 and all(c in LETTERS for c in name)
+    return all(len(part) >= 2 and part[0] in LETTERS and all(c in NAME for c in part[1:]) for part in parts)
+
+
+def iso_8601(data_string):
+    u'''
+    Parse `YYYY-MM-DD[( |T)HH:MM[:SS[.ffffff]]][[ ](Z|+HHMM|+HH:MM|NAME)]`
+    by position.
+
+    :param data_string: The input.
+    :return: The (time tuple, fraction, write format) given by `strptime` with
+             `ISO_8601[0]`, or `None` if the input has some other layout.
+    '''
+    n = len(data_string)
+    if n < 10 or data_string[4] != u'-' or data_string[7] != u'-':
+        return None
+    year = FOUR_DIGITS.get(data_string[0:4])
+    month = TWO_DIGITS.get(data_string[5:7])
+    day = TWO_DIGITS.get(data_string[8:10])
+    if year is None or month is None or day is None or not (1 <= month <= 12 and 1 <= day <= 31):
+        return None
+    try:
+        parsed = date(year, month, day)
+    except ValueError:
+        return None
+    write, i = u'%Y-%m-%d', 10
+    hour = minute = second = fraction = 0
+    tz, tzname, gmtoff = -1, None, None
+
+    if i + 6 <= n and data_string[i] in DATE_TIME and data_string[i+3] == u':':
+        hour = TWO_DIGITS.get(data_string[i+1:i+3])
+        minute = TWO_DIGITS.get(data_string[i+4:i+6])
+        if hour is None or hour > 23 or minute is None or minute > 59:
+            return None
+        write += DATE_TIME[data_string[i]]
+        i += 6
+        if i < n and data_string[i] == u':':
+            second = TWO_DIGITS.get(data_string[i+1:i+3])
+            if second is None or second > 61:
+                return None
+            write += u':%S'
+            i += 3
+            if i < n and data_string[i] == u'.':
+                j = i + 1
+                while j < n and data_string[j] in DIGITS:
+                    j += 1
+                digits = data_string[i+1:j]
+                if not 1 <= len(digits) <= 6:
+                    return None
+                fraction = int(digits + u'0' * (6 - len(digits)))
+                write += u'.%f'
+                i = j
+        elif data_string[i:i+1] in (u'+', u'-') or data_string[i:i+2] in (u' +', u' -'):
+            return None  # the regexp takes the hours of the offset as seconds
+
+    if i < n:
+        if data_string[i] == u' ':
+            write += u' '
+            i += 1
+        zone = data_string[i:]
+        if zone[:1] in (u'+', u'-'):
+            if len(zone) == 6 and zone[3] == u':':
+                zone = zone[:3] + zone[4:]
+            hours, minutes = TWO_DIGITS.get(zone[1:3]), TWO_DIGITS.get(zone[3:])
+            if len(zone) != 5 or hours is None or minutes is None or minutes > 59:
+                return None
+            gmtoff = (hours * 60 + minutes) * (60 if zone[0] == u'+' else -60)
+            write += u'%z'
+        elif _zone_name(zone):
+            tz, tzname = _tz(zone, None), zone
+            write += u'%Z'
+        else:
+            return None
+
+    julian = parsed.toordinal() - date(year, 1, 1).toordinal() + 1
+    return (year, month, day, hour, minute, second, parsed.weekday(), julian, tz, tzname, gmtoff), fraction, write
+
+
+def rfc_2822(data_string):
+    u'''
+    Parse `Www, D[D] Mmm YYYY HH:MM[:SS][ (+HHMM|+HH:MM|NAME)]` by position
+    (names of days and months are those of the process locale).  Obsolete
+    zones (GMT, EST, etc) are returned as names, as by the regexp (UT and
+    comments are not accepted by the regexp, so are not handled here).
+
+    :param data_string: The input.
+    :return: The (time tuple, fraction, write format) given by `strptime` with
+             `RFC_2822[0]` (inverted), or `None` if the input has some other
+             layout.
+    '''
+    comma = data_string.find(u',')
+    weekday = _names(u'a_weekday', LETTERS).get(data_string[:comma]) if comma > 0 else None
+    if weekday is None:
+        return None
+    i = comma + 2 if data_string[comma+1:comma+2] == u' ' else comma + 1
+    if data_string[i+1:i+2] == u' ':
+        day, i = TWO_DIGITS.get(u'0' + data_string[i]), i + 2
+    else:
+        day, i = TWO_DIGITS.get(data_string[i:i+2]), i + 3
+        if data_string[i-1:i] != u' ':
+            return None
+    space = data_string.find(u' ', i)
+    month = _names(u'a_month', ASCII).get(data_string[i:space]) if space > i else None
+    if day is None or not 1 <= day <= 31 or month is None:
+        return None
+    i = space + 1
+    if data_string[i+4:i+5] != u' ' or data_string[i+7:i+8] != u':':
+        return None
+    year = FOUR_DIGITS.get(data_string[i:i+4])
+    hour = TWO_DIGITS.get(data_string[i+5:i+7])
+    minute = TWO_DIGITS.get(data_string[i+8:i+10])
+    if year is None or hour is None or hour > 23 or minute is None or minute > 59:
+        return None
+    try:
+        julian = date(year, month, day).toordinal() - date(year, 1, 1).toordinal() + 1
+    except ValueError:
+        return None
+    write, i, n = u'%a,%d %b %Y %H:%M', i + 10, len(data_string)
+    second, tz, tzname, gmtoff = 0, -1, None, None
+
+    if i < n and data_string[i] == u':':
+        second = TWO_DIGITS.get(data_string[i+1:i+3])
+        if second is None or second > 61:
+            return None
+        write += u':%S'
+        i += 3
+    elif data_string[i:i+2] in (u' +', u' -'):
+        return None  # the regexp takes the hours of the offset as seconds
+
+    if i < n:
+        zone = data_string[i+1:]
+        if data_string[i] != u' ' or not zone:
+            return None
+        if zone[0] in (u'+', u'-'):
+            if len(zone) == 6 and zone[3] == u':':
+                zone = zone[:3] + zone[4:]
+            hours, minutes = TWO_DIGITS.get(zone[1:3]), TWO_DIGITS.get(zone[3:])
+            if len(zone) != 5 or hours is None or minutes is None or minutes > 59:
+                return None
+            gmtoff = (hours * 60 + minutes) * (60 if zone[0] == u'+' else -60)
+            write += u' %z'
+        elif _zone_name(zone):
+            tz, tzname = _tz(zone, None), zone
+            write += u' %Z'
+        else:
+            return None
+
+    return (year, month, day, hour, minute, second, weekday, julian, tz, tzname, gmtoff), 0, write
@@ -0,0 +1,81 @@
+
+from itertools import product
+from unittest import TestCase
+from simpledate import ISO_8601, RFC_2822
+from simpledate.fast import iso_8601, rfc_2822
+from simpledate.fmt import strptime, to_regexp, auto_invert
+
+
+def regexp_strptime(data_string, format):
+    # strptime without the fast path
+    compiled = to_regexp(format)
+    found = compiled.regexp.match(data_string)
+    if not found or found.end() != len(data_string):
+        raise ValueError(data_string)
+    return compiled.converter(found.groupdict()) + (compiled.rebuild(found.groupdict()),)
+
+
+class Iso8601Test(TestCase):
+
+    def test_strptime(self):
+        tt, fraction, write = strptime(u'2013-06-08T12:34:56.123+01:00', ISO_8601[0])
+        assert tt == (2013, 6, 8, 12, 34, 56, 5, 159, -1, None, 3600), tt
+        assert fraction == 123000, fraction
+        assert write == u'%Y-%m-%dT%H:%M:%S.%f%z', write
+        assert iso_8601(u'2013/06/08') is None
+        assert strptime(u'2013/06/08', ISO_8601[0])[2] == u'%Y-%m-%d'
+
+    def test_differential(self):
+        # every input handled by the fast path gives the same result as the
+        # regexp (and the fast path handles most of the usual layouts).
+        handled = 0
+        for date, time, zone in product(
+                [u'2013-06-08', u'2012-02-29', u'2013-02-29', u'2013-12-31', u'0000-01-01', u'2013-00-08',
+                 u'2013-13-08', u'2013-06-00', u'2013-06-32', u'2013-6-08', u'2013/06/08', u'20130608', u'2013-06'],
+                [u'', u' 12:34', u'T00:00', u't12:34', u'  12:34', u' 24:00', u' 12:60', u' 12:34:56', u'T23:59:60',
+                 u' 12:34:62', u' 12:34:5', u' 12:34:56.1', u' 12:34:56.123456', u' 12:34:56.1234567', u' 12:34:56.',
+                 u' 1:34', u' 12-34'],
+                [u'', u'Z', u'z', u' Z', u' EDT', u'EDT', u' UTC', u' America/New_York', u' America/Argentina/Buenos_Aires',
+                 u' Etc/GMT+5', u' EST5EDT', u' Ab', u' A/Bc', u'+0100', u'-01:00', u' +0530', u' -2459', u'+0160',
+                 u'+01', u' ', u'  EDT', u'/EDT', u'+01.00']):
+            text = date + time + zone
+            fast = iso_8601(text)
+            try:
+                expected = regexp_strptime(text, ISO_8601[0])
+            except ValueError:
+                expected = None
+            if fast is not None:
+                handled += 1
+                assert fast == expected, (text, fast, expected)
+        assert handled > 200, handled
+
+
+class Rfc2822Test(TestCase):
+
+    def test_strptime(self):
+        tt, fraction, write = strptime(u'Tue, 18 Jun 2013 12:19:09 -0400', auto_invert(RFC_2822[0]))
+        assert tt == (2013, 6, 18, 12, 19, 9, 1, 169, -1, None, -14400), tt
+        assert fraction == 0, fraction
+        assert write == u'%a,%d %b %Y %H:%M:%S %z', write
+        assert rfc_2822(u'Tue 18 Jun 2013 12:19:09 -0400') is None
+
+    def test_differential(self):
+        format = auto_invert(RFC_2822[0])
+        handled = 0
+        for day, date, time, zone in product(
+                [u'Tue, ', u'Tue,', u'tue, ', u'Mon, ', u'Tuesday, ', u'Tue ', u'Tue,  ', u'Xyz, ', u', ', u''],
+                [u'18 Jun 2013', u'8 Jun 2013', u'08 JUN 2013', u'29 Feb 2012', u'29 Feb 2013', u'31 Dec 1969',
+                 u'0 Jun 2013', u'32 Jun 2013', u'18 June 2013', u'18-Jun-2013', u'18 Jun 13', u'18Jun2013', u' 8 Jun 2013'],
+                [u' 12:19:09', u' 12:19', u' 00:00:60', u' 24:00', u' 12:60', u' 12:19:9', u' 12.19.09', u' 2:19:09'],
+                [u'', u' -0400', u' +0000', u' +05:30', u' -2460', u' GMT', u' UT', u' EST', u' Z', u' America/New_York',
+                 u' -0400 (EDT)', u'-0400', u'GMT', u'  GMT', u' ', u' +04']):
+            text = day + date + time + zone
+            fast = rfc_2822(text)
+            try:
+                expected = regexp_strptime(text, format)
+            except ValueError:
+                expected = None
+            if fast is not None:
+                handled += 1
+                assert fast == expected, (text, fast, expected)
+        assert handled > 200, handled
@@ -1,19 +1,24 @@
 
 from __future__ import with_statement
-#from functools import lru_cache
-from functools32 import lru_cache
-from simpledate.utils import HashableDict
+from simpledate.utils import HashableDict, ComputedCache, SharedLock, VERSION
+from threading import Lock
+from locale import setlocale, getlocale, LC_TIME
 from itertools import imap
 
-try:
-    from thread import allocate_lock as _thread_allocate_lock
-except ImportError:
-    from _dummy_thread import allocate_lock as _thread_allocate_lock
 from _strptime import LocaleTime, _calc_julian_from_U_or_W
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from datetime import date
+from json import dump, load
+from os import environ, rename
+from os.path import dirname, abspath
+from tempfile import NamedTemporaryFile
 import time
 from re import sub, escape, compile, IGNORECASE
+from sre_parse import parse as parse_regexp
+from sre_constants import LITERAL as LITERAL_OP, IN as IN_OP, RANGE as RANGE_OP, CATEGORY as CATEGORY_OP, \
+    SUBPATTERN as SUBPATTERN_OP, BRANCH as BRANCH_OP, MAX_REPEAT as MAX_REPEAT_OP, MIN_REPEAT as MIN_REPEAT_OP, \
+    AT as AT_OP, ASSERT as ASSERT_OP, ASSERT_NOT as ASSERT_NOT_OP, CATEGORY_DIGIT, CATEGORY_WORD, \
+    CATEGORY_NOT_WORD, CATEGORY_SPACE, MAXREPEAT
 
 
 # extend the usual date parsing with:
@@ -77,10 +82,12 @@ def tokenizer(fmt):
         i = j
 
 
-def _to_regexp(fmt, to_regex=None, to_write=None):
+def _to_regexp(fmt, to_regex=None, to_write=None, locale=None):
     u'''
     Given a format, construct the equivalent regexp (and compile it) and
     the information needed to reconstruct a matching template after use.
+    Values in `to_regex` that depend on the locale (see `Localized`) are
+    taken from the tables for `locale`.
 
     The reconstruction works by embedding empty matches in the regexp that
     record which parts of the expression were matched.  For example, a
@@ -112,13 +119,15 @@ def _to_regexp(fmt, to_regex=None, to_write=None):
     count = 0  # latest group
     stack = [0]  # nested groups
     rebuild = defaultdict(lambda: u'')  # group substitutions
+    regex = []  # local (not an attribute) so that compilation is re-entrant
 
-    _to_regexp.regex = u''
     tokens = tokenizer(fmt)
 
     def append(token, write=None):
-        #nonlocal regex
-        _to_regexp.regex += to_regex.get(token, token)
+        value = to_regex.get(token, token)
+        if isinstance(value, Localized):
+            value = locale_tables(locale)(value)
+        regex.append(value)
         if write is None:
             write = token
         rebuild[u'G%d' % stack[-1]] += to_write.get(write, write)
@@ -146,7 +155,8 @@ def _to_regexp(fmt, to_regex=None, to_write=None):
     if stack != [0]:
         raise ValueError(u'Unmatched %(')
 
-    return _to_regexp.regex, rebuild, compile(_to_regexp.regex, IGNORECASE)
+    regex = u''.join(regex)
+    return CompiledFormat(regex, Rebuild(rebuild), compile(regex, IGNORECASE), locale)
 
 
 TAG = compile(ur'(?:^|[^%])%(G\d+)%')
@@ -169,7 +179,389 @@ def reconstruct(rebuild, found_dict):
         fmt = fmt[:match.start(1)-1] + replacement + fmt[match.end(1)+1:]
 
 
-LOCALE_TIME = LocaleTime()
+class Rebuild(dict):
+    u'''
+    A reconstruction dictionary (as returned by `to_regexp`) that can also
+    be called with the groups from a match to give the write format.
+
+    The result depends only on which marker groups were matched, so is
+    cached by a bitmask of those (a format has only a few such
+    combinations, so the cache is small, and repeated parses share the
+    same format string).
+    '''
+
+    def __init__(self, rebuild):
+        super(Rebuild, self).__init__(rebuild)
+        self.markers = tuple((name, 1 << bit) for bit, name in enumerate(sorted(self)) if name != u'G0')
+        self.formats = {}
+
+    def __missing__(self, key):
+        return u''
+
+    def __call__(self, found_dict):
+        u'''
+        :param found_dict: The groups matched.
+        :return: The write format (as `reconstruct`).
+        '''
+        key = 0
+        for name, bit in self.markers:
+            if found_dict.get(name) is not None:
+                key |= bit
+        try:
+            return self.formats[key]
+        except KeyError:
+            fmt = self.formats[key] = reconstruct(self, found_dict)
+            return fmt
+
+
+# values that depend on the locale (the names of months and days, am/pm,
+# and the formats for %c, %x and %X) are found only when a format needs
+# them, and separately for each locale, so that parsers for different
+# locales can be used together.
+
+class Localized(object):
+    u'''
+    A placeholder (in the regexp tables and `GROUP_CONVERTERS`) for a value
+    that depends on the locale.  It is evaluated by the `LocaleTables` for
+    the locale in use.
+    '''
+
+    __slots__ = (u'function',)
+
+    def __init__(self, function):
+        u'''
+        :param function: Called with a `LocaleTables` to give the value.
+        '''
+        self.function = function
+
+
+# setlocale() is process-wide, so while the tables for a named locale are
+# found, everything in the process that depends on the locale sees it.  the
+# lock is held (exclusively) only for the switch; the library's own use of
+# the locale (the tables for the process locale, and strftime in
+# `Formatter`) shares it, so waits for a switch but not for other readers.
+# other code (eg datetime.strftime or time.strptime called directly in
+# another thread) is NOT excluded.  this happens once per locale; to avoid
+# it, get the tables (eg `locale_tables('es_ES.UTF-8').time`) before
+# starting other threads.
+_SETLOCALE_LOCK = SharedLock()
+
+def _locale_time(locale):
+    if locale is None:
+        _SETLOCALE_LOCK.acquire_shared()
+        try:
+            return LocaleTime()
+        finally:
+            _SETLOCALE_LOCK.release_shared()
+    with _SETLOCALE_LOCK:
+        previous = setlocale(LC_TIME)
+        setlocale(LC_TIME, locale)
+        try:
+            return LocaleTime()
+        finally:
+            setlocale(LC_TIME, previous)
+
+
+class LocaleTables(object):
+    u'''
+    The locale-dependent values for one locale, found when first needed
+    (by switching the process locale briefly, if the locale is named - see
+    `_SETLOCALE_LOCK` for when that is visible to other threads) and then
+    retained.
+    '''
+
+    def __init__(self, locale=None):
+        u'''
+        :param locale: The locale name (eg 'es_ES.UTF-8'), or `None` for the
+                       locale of the process when the values are first needed.
+        '''
+        self.locale = locale
+        self.__time = None
+        self.__values = {}
+
+    @property
+    def time(self):
+        u'''
+        :return: The `_strptime.LocaleTime` for the locale.
+        '''
+        if self.__time is None:
+            self.__time = _locale_time(self.locale)
+        return self.__time
+
+    def names(self, name):
+        u'''
+        :param name: An attribute of `LocaleTime` (eg `a_month`).
+        :return: The value (as unicode, or a list of unicode for names).
+        '''
+        value = getattr(self.time, name)
+        encoding = self.time.lang[1] or u'ascii'
+        decode = lambda text: text.decode(encoding) if isinstance(text, bytes) else text
+        return decode(value) if isinstance(value, basestring) else [decode(text) for text in value]
+
+    def __call__(self, localized):
+        u'''
+        :param localized: A `Localized` placeholder.
+        :return: Its value for this locale.
+        '''
+        try:
+            return self.__values[localized]
+        except KeyError:
+            value = self.__values[localized] = localized.function(self)
+            return value
+
+
+_LOCALE_TABLES = {}
+_LOCALE_TABLES_LOCK = Lock()
+
+def locale_tables(locale=None):
+    u'''
+    :param locale: The locale name, or `None` for the process locale.
+    :return: The (shared) `LocaleTables` for the locale.
+    '''
+    try:
+        return _LOCALE_TABLES[locale]
+    except KeyError:
+        with _LOCALE_TABLES_LOCK:
+            return _LOCALE_TABLES.setdefault(locale, LocaleTables(locale))
+
+
+# an optional file (named by the SIMPLEDATE_FORMAT_CACHE environment
+# variable, or given to load_format_cache()) can hold the regexps and
+# reconstruction tables for formats, so that new processes (eg workers)
+# need not derive them again.  the file is written by save_format_cache()
+# and is ignored if the library version or locale differ.  only formats for
+# the process locale are stored.
+
+FORMAT_CACHE_ENV = u'SIMPLEDATE_FORMAT_CACHE'
+_STORED = {u'regexp': {}, u'shape': {}}  # table -> format -> stored value
+
+def format_cache_key():
+    u'''
+    :return: The key that must match for a cache file to be used (the
+             library version and the locale).
+    '''
+    _SETLOCALE_LOCK.acquire_shared()
+    try:
+        locale = getlocale(LC_TIME)
+    finally:
+        _SETLOCALE_LOCK.release_shared()
+    return u'%s %s' % (VERSION, u'.'.join(unicode(part) for part in locale))
+
+def load_format_cache(path):
+    u'''
+    Use the tables in a file written by `save_format_cache` (in addition to
+    any already loaded).  Formats are still compiled when first used, but
+    their regexps and reconstruction tables are taken from the file.
+
+    :param path: The file to read.
+    :return: True if the file was read and matched the library version and
+             locale (a missing or unreadable file is ignored).
+    '''
+    try:
+        with open(path) as input:
+            data = load(input)
+    except (IOError, ValueError):
+        return False
+    if not isinstance(data, dict) or data.get(u'key') != format_cache_key():
+        return False
+    for table, stored in _STORED.items():
+        stored.update(data.get(u'tables', {}).get(table, {}))
+    return True
+
+if environ.get(FORMAT_CACHE_ENV):
+    load_format_cache(environ[FORMAT_CACHE_ENV])
+
+
+# conversion of matched groups to a time tuple.  each format has its own
+# converter, which only looks at the groups that the format can produce
+# (rather than testing every key in the match against every directive).
+
+# fields in the list used during conversion (and their initial values).
+YEAR, MONTH, DAY, HOUR, MINUTE, SECOND, WEEKDAY, JULIAN, TZ, FRACTION, TZOFFSET, WEEK, WEEK_START = range(13)
+INITIAL = (None, 1, 1, 0, 0, 0, -1, -1, -1, 0, None, -1, -1)
+
+def _year_y(value, _):
+    # Open Group specification for strptime() states that a %y value in the
+    # range of [00, 68] is in the century 2000, while [69,99] is in the
+    # century 1900
+    year = int(value)
+    return year + 2000 if year <= 68 else year + 1900
+
+def _year_y50(value, _):
+    # ASN.1 / RFC 3852
+    year = int(value)
+    return year + 2000 if year < 50 else year + 1900
+
+def _hour_I(am_pm):
+    def hour_I(value, found_dict):
+        hour = int(value)
+        ampm = (found_dict.get(u'p') or u'').lower()
+        # If there was no AM/PM indicator, we'll treat this like AM
+        if ampm in (u'', am_pm[0]):
+            # We're in AM so the hour is correct unless we're looking at 12
+            # midnight.  12 midnight == 12 AM == hour 0
+            if hour == 12:
+                hour = 0
+        elif ampm == am_pm[1]:
+            # We're in PM so we need to add 12 to the hour unless we're looking
+            # at 12 noon.  12 noon == 12 PM == hour 12
+            if hour != 12:
+                hour += 12
+        return hour
+    return hour_I
+
+def _fraction(value, _):
+    # Pad to always return microseconds.
+    return int(value + u"0" * (6 - len(value)))
+
+def _weekday_w(value, _):
+    weekday = int(value)
+    return 6 if weekday == 0 else weekday - 1
+
+def _tzoffset(value, _):
+    tzoffset = int(value[1:3]) * 60 + int(value[-2:])
+    return -tzoffset if value.startswith(u"-") else tzoffset
+
+# as LocaleTime.timezone (which does not depend on the locale).
+try:
+    time.tzset()
+except AttributeError:
+    pass
+TIMEZONE = (frozenset([u'utc', u'gmt', time.tzname[0].lower()]),
+            frozenset([time.tzname[1].lower()]) if time.daylight else frozenset())
+
+def _tz(value, _):
+    # -1 is the default, so only need to find values other than that.
+    found_zone = value.lower()
+    for tz, tz_values in enumerate(TIMEZONE):
+        if found_zone in tz_values:
+            # Deal with bad locale setup where timezone names are the same
+            # and yet time.daylight is true; too ambiguous to be able to tell
+            # what timezone has daylight savings
+            if (time.tzname[0] == time.tzname[1] and
+               time.daylight and found_zone not in (u"utc", u"gmt")):
+                return -1
+            else:
+                return tz
+    return -1
+
+def _int(value, _): return int(value)
+def _lookup(names): return lambda value, _: names.index(value.lower())
+def _localized_lookup(name): return Localized(lambda tables: _lookup(tables.names(name)))
+def _constant(constant): return lambda value, _: constant
+
+# Directives not handled here:
+#   c, x, X
+#      handled by making out of other directives
+GROUP_CONVERTERS = {
+    u'y': ((YEAR, _year_y),),
+    u'y50': ((YEAR, _year_y50),),
+    u'Y': ((YEAR, _int),),
+    u'm': ((MONTH, _int),),
+    u'B': ((MONTH, _localized_lookup(u'f_month')),),
+    u'b': ((MONTH, _localized_lookup(u'a_month')),),
+    u'd': ((DAY, _int),),
+    u'H': ((HOUR, _int),),
+    u'I': ((HOUR, Localized(lambda tables: _hour_I(tables.names(u'am_pm')))),),
+    u'M': ((MINUTE, _int),),
+    u'S': ((SECOND, _int),),
+    u'f': ((FRACTION, _fraction),),
+    u'A': ((WEEKDAY, _localized_lookup(u'f_weekday')),),
+    u'a': ((WEEKDAY, _localized_lookup(u'a_weekday')),),
+    u'w': ((WEEKDAY, _weekday_w),),
+    u'j': ((JULIAN, _int),),
+    # U starts week on Sunday, W on Monday.
+    u'U': ((WEEK, _int), (WEEK_START, _constant(6))),
+    u'W': ((WEEK, _int), (WEEK_START, _constant(0))),
+    u'z': ((TZOFFSET, _tzoffset),),
+    u'Z': ((TZ, _tz),),
+}
+
+
+class Converter(object):
+    u'''
+    Convert the groups matched by a format to a time tuple and fraction
+    (closely based on _strptime in standard Python).
+    '''
+
+    __slots__ = (u'__steps',)
+
+    def __init__(self, names, locale=None):
+        u'''
+        :param names: The names of the groups the format can match (others
+                      are ignored).
+        :param locale: The locale name (`None` for the process locale).
+        '''
+        resolve = lambda function: locale_tables(locale)(function) if isinstance(function, Localized) else function
+        self.__steps = tuple((name, index, resolve(function))
+                             for name in names if name in GROUP_CONVERTERS
+                             for index, function in GROUP_CONVERTERS[name])
+
+    def __call__(self, found_dict, full=True):
+        u'''
+        :param found_dict: The groups matched.
+        :param full: If false, weekday and julian day are left as -1 unless
+                     given in the input (which avoids some work if they are
+                     not needed).
+        :return: The time tuple (as `time.strptime`) and fraction.
+        '''
+        fields = list(INITIAL)
+        for name, index, function in self.__steps:
+            value = found_dict[name]
+            if value is not None:
+                fields[index] = function(value, found_dict)
+        year, month, day, hour, minute, second, weekday, julian, tz, fraction, tzoffset, week_of_year, week_of_year_start = fields
+        leap_year_fix = False
+        if year is None and month == 2 and day == 29:
+            year = 1904  # 1904 is first leap year of 20th century
+            leap_year_fix = True
+        elif year is None:
+            year = 1900
+        # If we know the week of the year and what day of that week, we can
+        # figure out the Julian day of the year.
+        if julian == -1 and week_of_year != -1 and weekday != -1:
+            week_starts_Mon = True if week_of_year_start == 0 else False
+            julian = _calc_julian_from_U_or_W(year, week_of_year, weekday, week_starts_Mon)
+        # Cannot pre-calculate date() since can change in Julian calculation
+        # and thus could have different value for the day of the week
+        # calculation.
+        if julian == -1:
+            if full:
+                # Need to add 1 to result since first day of the year is 1,
+                # not 0.
+                julian = date(year, month, day).toordinal() - date(year, 1, 1).toordinal() + 1
+        else:  # Assume that if they bothered to include Julian day it will
+               # be accurate.
+            datetime_result = date.fromordinal((julian - 1) + date(year, 1, 1).toordinal())
+            year = datetime_result.year
+            month = datetime_result.month
+            day = datetime_result.day
+        if weekday == -1 and full:
+            weekday = date(year, month, day).weekday()
+        # Add timezone info
+        tzname = found_dict.get(u'Z')
+        gmtoff = None if tzoffset is None else tzoffset * 60
+        if leap_year_fix:
+            # the caller didn't supply a year but asked for Feb 29th. We
+            # couldn't use the default of 1900 for computations. We set it
+            # back to ensure that February 29th is smaller than March 1st.
+            year = 1900
+        return (year, month, day,
+                hour, minute, second,
+                weekday, julian, tz, tzname, gmtoff), fraction
+
+
+class CompiledFormat(namedtuple(u'CompiledFormat', u'pattern rebuild regexp')):
+    u'''
+    The result of `to_regexp`: the regexp (as text), the reconstruction
+    dictionary and the compiled regexp, plus a `converter` for the groups
+    that the regexp can match.
+    '''
+
+    def __new__(cls, pattern, rebuild, regexp, locale=None):
+        self = super(CompiledFormat, cls).__new__(cls, pattern, rebuild, regexp)
+        self.converter = Converter(sorted(regexp.groupindex, key=regexp.groupindex.get), locale)
+        return self
 
 
 def seq_to_re(to_convert, directive):
@@ -193,19 +585,22 @@ SYMBOL = ur'\W+'
 # these are the definitions used in the standard Python implementation
 # (use hashable dict for cache around _to_regex).
 
+def _localized_names(name, directive, first=0):
+    return Localized(lambda tables: seq_to_re(tables.names(name)[first:], directive))
+
 BASE_TO_REGEX = HashableDict({
     u' ': u'\s+',
-    u'%a': seq_to_re(LOCALE_TIME.a_weekday, u'a'),
-    u'%A': seq_to_re(LOCALE_TIME.f_weekday, u'A'),
-    u'%b': seq_to_re(LOCALE_TIME.a_month[1:], u'b'),
-    u'%B': seq_to_re(LOCALE_TIME.f_month[1:], u'B'),
+    u'%a': _localized_names(u'a_weekday', u'a'),
+    u'%A': _localized_names(u'f_weekday', u'A'),
+    u'%b': _localized_names(u'a_month', u'b', 1),
+    u'%B': _localized_names(u'f_month', u'B', 1),
     u'%d': ur'(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])',
     u'%f': ur'(?P<f>[0-9]{1,6})',
     u'%H': ur'(?P<H>2[0-3]|[0-1]\d|\d)',
     u'%I': ur'(?P<I>1[0-2]|0[1-9]|[1-9])',
     u'%j': ur'(?P<j>36[0-6]|3[0-5]\d|[1-2]\d\d|0[1-9]\d|00[1-9]|[1-9]\d|0[1-9]|[1-9])',
     u'%m': ur'(?P<m>1[0-2]|0[1-9]|[1-9])',
-    u'%p': seq_to_re(LOCALE_TIME.am_pm, u'p'),
+    u'%p': _localized_names(u'am_pm', u'p'),
     u'%M': ur'(?P<M>[0-5]\d|\d)',
     u'%S': ur'(?P<S>6[0-1]|[0-5]\d|\d)',
     u'%U': WEEK_NUMBER(u'U'),
@@ -218,11 +613,14 @@ BASE_TO_REGEX = HashableDict({
     u'%%': u'%',
 })
 
+def _localized_format(name):
+    return Localized(lambda tables: _to_regexp(tables.names(name), BASE_TO_REGEX, {}, tables.locale)[0])
+
 PYTHON_TO_REGEX= HashableDict(BASE_TO_REGEX)
 PYTHON_TO_REGEX.update({
-    u'%c': _to_regexp(LOCALE_TIME.LC_date_time, BASE_TO_REGEX, {})[0],
-    u'%x': _to_regexp(LOCALE_TIME.LC_date, BASE_TO_REGEX, {})[0],
-    u'%X': _to_regexp(LOCALE_TIME.LC_time, BASE_TO_REGEX, {})[0],
+    u'%c': _localized_format(u'LC_date_time'),
+    u'%x': _localized_format(u'LC_date'),
+    u'%X': _localized_format(u'LC_time'),
 })
 
 
@@ -282,15 +680,395 @@ DEFAULT_TO_WRITE = dict(imap(auto_convert, FLEXIBLE_REGEX.keys()))
 DEFAULT_TO_WRITE.update(HIDE_CHOICES)
 
 
-# thread-safe caching
+# thread-safe caching (hits take no lock - see ComputedCache).  the size
+# of all caches can be changed with set_cache_size().
 
 CACHE_MAX_SIZE = 100
-_CACHE_LOCK = _thread_allocate_lock()
-_CACHED_REGEXP = lru_cache(maxsize=CACHE_MAX_SIZE)(_to_regexp)
 
-def to_regexp(fmt, substitutions=None):
-    with _CACHE_LOCK:
-        return _CACHED_REGEXP(fmt, substitutions)
+def _compile_format(fmt, substitutions, locale=None):
+    stored = None if substitutions is not None or locale is not None else _STORED[u'regexp'].get(fmt)
+    if stored is None:
+        return _to_regexp(fmt, substitutions, locale=locale)
+    pattern, rebuild = stored
+    return CompiledFormat(pattern, Rebuild(rebuild), compile(pattern, IGNORECASE))
+
+_CACHED_REGEXP = ComputedCache(_compile_format, CACHE_MAX_SIZE)
+
+def to_regexp(fmt, substitutions=None, locale=None):
+    return _CACHED_REGEXP(fmt, substitutions, locale)
+
+
+GROUP_NAME = compile(ur'(?<!\\)\(\?P<(\w+)>')
+MAX_GROUPS = 99  # the most groups in a single regexp (python < 3.5 counts the whole match too)
+
+def _to_alternation(formats, locale=None):
+    u'''
+    Combine several formats into regexps that each cover many formats, so
+    that one match both selects the first format that matches and captures
+    its groups.
+
+    Each format becomes an alternative that starts with an empty marker
+    group (F0, F1...) to show which alternative matched.  Group names are
+    prefixed with the marker (so G1 in the second format becomes F1_G1, for
+    example) to avoid clashes.  Formats are only split across several
+    regexps when there are too many groups for one.
+
+    Since alternatives are tried in order, the match is exactly what the
+    first format that matches would give alone (in particular, it may not
+    consume all the input).
+
+    Returns a sequence of (regexp, branches), where branches describe each
+    format in the regexp: the index of the format, the index of the marker
+    in the match groups, the (original name, index) of each group, the
+    reconstruction dictionary and the converter.
+    '''
+    combined, alternatives, branches, offset = [], [], [], 0
+    for index, fmt in enumerate(formats):
+        compiled = to_regexp(fmt, locale=locale)
+        pattern, rebuild, regex = compiled
+        if alternatives and offset + regex.groups + 1 > MAX_GROUPS:
+            combined.append((compile(u'|'.join(alternatives), IGNORECASE), tuple(branches)))
+            alternatives, branches, offset = [], [], 0
+        prefix = u'F%d' % index
+        alternatives.append(u'(?P<%s>)%s' % (prefix, GROUP_NAME.sub(ur'(?P<%s_\1>' % prefix, pattern)))
+        names = [(name, offset + number) for name, number in regex.groupindex.items()]
+        branches.append((index, offset, names, rebuild, compiled.converter))
+        offset += regex.groups + 1
+    if alternatives:
+        combined.append((compile(u'|'.join(alternatives), IGNORECASE), tuple(branches)))
+    return tuple(combined)
+
+_CACHED_ALTERNATION = ComputedCache(_to_alternation, CACHE_MAX_SIZE)
+
+def to_alternation(formats, locale=None):
+    return _CACHED_ALTERNATION(tuple(formats), locale)
+
+
+# some formats have hand-written parsers (see simpledate.fast) that handle
+# the usual layout of the input faster than the regexp.  these return the
+# result of strptime directly (or None, in which case the regexp is used).
+
+FAST_PATHS = {}  # format -> parser
+
+def register_fast_path(fmt, parser):
+    u'''
+    :param fmt: The format (as used in `strptime`, so inverted if necessary).
+    :param parser: Called with the input, returns the same (time tuple,
+                   fraction, write format) as `strptime` with `fmt`, or `None`
+                   if the input is not handled.  Only used for the process
+                   locale.
+    '''
+    FAST_PATHS[fmt] = parser
+
+def _fast_rebuild(found):
+    return found[2]
+
+def _fast_converter(found, full=True):
+    return found[:2]
+
+
+def matches(data_string, formats, locale=None):
+    u'''
+    Generate (format, rebuild, converter, found_dict) for each format that
+    matches all of the input, in order (the same results as calling
+    `strptime` with each format in turn, but without the exceptions, and
+    with a single match to skip all the formats that fail).  Names are
+    matched for the given locale (`None` for the process locale).
+
+    The found_dict should be treated as opaque (it is only given to the
+    converter and rebuild, and is not a dict for fast paths).
+    '''
+    formats = tuple(formats)
+    start = 0
+    while start < len(formats):
+        parser = FAST_PATHS.get(formats[start]) if locale is None else None
+        if parser:
+            result = parser(data_string)
+            if result is not None:
+                yield formats[start], _fast_rebuild, _fast_converter, result
+                start += 1
+                continue
+        for regex, branches in to_alternation(formats[start:], locale):
+            found = regex.match(data_string)
+            if found:
+                break
+        else:
+            return
+        groups = found.groups()
+        for index, marker, names, rebuild, converter in branches:
+            if groups[marker] is not None:
+                break
+        if found.end() == len(data_string):
+            yield formats[start+index], rebuild, converter, dict((name, groups[number]) for name, number in names)
+        start += index + 1
+
+
+# the "shape" of the input replaces each digit with 0 and each letter with
+# a (so 2013-06-08 12:34 EDT becomes 0000-00-00 00:00 aaa).  each format is
+# translated to a regexp over shapes, which can match any input that the
+# original might.  data feeds usually contain only a few shapes, so the
+# formats that might match each shape can be cached, and formats that
+# cannot match are never tried.
+
+SHAPE = dict([(ord(c), u'0') for c in u'0123456789'] +
+             [(ord(c), u'a') for c in u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'])
+WORD_SHAPES = u'0a_'
+WHITESPACE = u' \t\n\r\f\v'
+ANYTHING = ur'[\s\S]'
+
+def _shape_chars(code):
+    u'''
+    The shapes of a character (more than one if the other case differs,
+    since all regexps are case-insensitive).
+    '''
+    char = unichr(code)
+    return set(c.translate(SHAPE) for c in (char, char.lower(), char.upper()))
+
+def _shape_set(items):
+    u'''
+    Translate the contents of a character set (ie [...]).
+    '''
+    chars, non_word = set(), False
+    for op, av in items:
+        if op == LITERAL_OP:
+            chars.update(_shape_chars(av))
+        elif op == RANGE_OP and av[1] - av[0] < 128:
+            for code in xrange(av[0], av[1] + 1):
+                chars.update(_shape_chars(code))
+        elif op == CATEGORY_OP and av == CATEGORY_DIGIT:
+            chars.add(u'0')
+        elif op == CATEGORY_OP and av == CATEGORY_WORD:
+            chars.update(WORD_SHAPES)
+        elif op == CATEGORY_OP and av == CATEGORY_NOT_WORD:
+            non_word = True
+        elif op == CATEGORY_OP and av == CATEGORY_SPACE:
+            chars.update(WHITESPACE)
+        else:
+            return ANYTHING
+    if non_word:
+        excluded = u''.join(c for c in WORD_SHAPES if c not in chars)
+        return u'[^%s]' % escape(excluded) if excluded else ANYTHING
+    else:
+        return u'[%s]' % u''.join(imap(escape, sorted(chars)))
+
+def _shape_regexp(pattern):
+    u'''
+    Translate a parsed regexp to one that matches the shapes of the inputs
+    it matches (and perhaps others).
+    '''
+    regex = u''
+    for op, av in pattern:
+        if op == LITERAL_OP:
+            regex += _shape_set([(op, av)])
+        elif op == IN_OP:
+            regex += _shape_set(av)
+        elif op == SUBPATTERN_OP:
+            regex += u'(?:%s)' % _shape_regexp(av[-1])
+        elif op == BRANCH_OP:
+            regex += u'(?:%s)' % u'|'.join(imap(_shape_regexp, av[1]))
+        elif op in (MAX_REPEAT_OP, MIN_REPEAT_OP):
+            lo, hi, item = av
+            regex += u'(?:%s){%d,%s}' % (_shape_regexp(item), lo, u'' if hi == MAXREPEAT else hi)
+        elif op in (AT_OP, ASSERT_OP, ASSERT_NOT_OP):
+            pass  # dropping constraints only allows more
+        else:
+            regex += ANYTHING + u'*'
+    return regex
+
+def _to_shape_regexp(fmt, locale=None):
+    pattern = None if locale is not None else _STORED[u'shape'].get(fmt)
+    if pattern is None:
+        pattern = _shape_regexp(parse_regexp(to_regexp(fmt, locale=locale)[0], IGNORECASE)) + ur'\Z'
+    return compile(pattern)
+
+_CACHED_SHAPE_REGEXP = ComputedCache(_to_shape_regexp, CACHE_MAX_SIZE)
+
+def to_shape_regexp(fmt, locale=None):
+    u'''
+    :return: A regexp that matches (all of) the shape of any input that
+             the format could match.
+    '''
+    return _CACHED_SHAPE_REGEXP(fmt, locale)
+
+
+# writing.  a write format is compiled once to a template for str.format
+# that reads the fields directly from the datetime, which avoids strftime
+# parsing the format (and building a time tuple) on each call.  only
+# directives that do not depend on the locale or platform are compiled;
+# anything else (and years before 1900, which strftime rejects) is left to
+# strftime, so the results are always the same.
+
+class _UseStrftime(Exception): pass
+
+def _write_offset(datetime):
+    offset = datetime.utcoffset()
+    if offset is None:
+        return ''
+    if offset.microseconds or offset.seconds % 60:
+        raise _UseStrftime()  # strftime raises an error
+    minutes = offset.days * 1440 + offset.seconds // 60
+    sign = '-' if minutes < 0 else '+'
+    minutes = abs(minutes)
+    return '%s%02d%02d' % (sign, minutes // 60, minutes % 60)
+
+def _write_name(datetime):
+    tzinfo = datetime.tzinfo
+    if tzinfo is None:
+        return ''
+    name = tzinfo.tzname(datetime)
+    if name is None:
+        return ''
+    if not isinstance(name, str):
+        raise _UseStrftime()  # strftime raises an error
+    return name
+
+# directive -> field of the datetime or (spec, function of the datetime)
+WRITE_FIELDS = {
+    u'Y': u'{0.year}',
+    u'y': (u':02', lambda datetime: datetime.year % 100),
+    u'm': u'{0.month:02}',
+    u'd': u'{0.day:02}',
+    u'j': (u':03', lambda datetime: datetime.toordinal() - date(datetime.year, 1, 1).toordinal() + 1),
+    u'H': u'{0.hour:02}',
+    u'I': (u':02', lambda datetime: datetime.hour % 12 or 12),
+    u'M': u'{0.minute:02}',
+    u'S': u'{0.second:02}',
+    u'f': u'{0.microsecond:06}',
+    u'z': (u'', _write_offset),
+    u'Z': (u'', _write_name)
+}
+
+class Formatter(object):
+    u'''
+    A compiled write format, called with a datetime to give the same string
+    as `datetime.strftime(format)`.
+    '''
+
+    __slots__ = (u'format', u'template', u'functions')
+
+    def __init__(self, format):
+        self.format = format
+        self.template, self.functions = None, ()
+        template, functions, i = [], [], 0
+        while i < len(format):
+            char, directive = format[i], format[i+1:i+2]
+            if char != u'%':
+                if ord(char) > 127:
+                    return
+                template.append(char * 2 if char in u'{}' else char)
+            elif directive == u'%':
+                template.append(u'%')
+            elif directive in WRITE_FIELDS:
+                field = WRITE_FIELDS[directive]
+                if isinstance(field, tuple):
+                    functions.append(field[1])
+                    field = u'{%d%s}' % (len(functions), field[0])
+                template.append(field)
+            else:
+                return
+            i += 1 if char != u'%' else 2
+        self.template, self.functions = str(u''.join(template)), tuple(functions)
+
+    def __call__(self, datetime):
+        if self.template is None or datetime.year < 1900:
+            return self.__strftime(datetime)
+        if not self.functions:
+            return self.template.format(datetime)
+        try:
+            return self.template.format(datetime, *[function(datetime) for function in self.functions])
+        except _UseStrftime:
+            return self.__strftime(datetime)
+
+    def __strftime(self, datetime):
+        _SETLOCALE_LOCK.acquire_shared()  # not while the locale is switched for another thread
+        try:
+            return datetime.strftime(self.format)
+        finally:
+            _SETLOCALE_LOCK.release_shared()
+
+_CACHED_FORMATTER = ComputedCache(Formatter, CACHE_MAX_SIZE)
+
+def formatter(fmt):
+    u'''
+    :param fmt: A write format (as used by `strftime`).
+    :return: A (cached) `Formatter` for the format.
+    '''
+    return _CACHED_FORMATTER(fmt)
+
+
+CACHES = {u'regexp': _CACHED_REGEXP, u'alternation': _CACHED_ALTERNATION, u'shape': _CACHED_SHAPE_REGEXP,
+          u'formatter': _CACHED_FORMATTER}
+
+def set_cache_size(maxsize):
+    u'''
+    :param maxsize: The number of entries retained by each of the format
+                    caches (compiled formats, combined formats and shapes).
+    '''
+    for cache in CACHES.values():
+        cache.resize(maxsize)
+
+def cache_info():
+    u'''
+    :return: A dict from cache name to statistics (a `CacheInfo` with hits,
+             misses, evictions, maxsize and currsize).
+    '''
+    return dict((name, cache.info()) for name, cache in CACHES.items())
+
+
+def save_format_cache(path):
+    u'''
+    Write the regexps and reconstruction tables for the formats compiled so
+    far (with the default substitutions) to a file, for `load_format_cache`
+    (so typically called after creating the parsers a program uses).
+
+    :param path: The file to write (replaced atomically).
+    '''
+    regexps, shapes = dict(_STORED[u'regexp']), dict(_STORED[u'shape'])
+    for (fmt, substitutions, locale), compiled in _CACHED_REGEXP.items():
+        if substitutions is None and locale is None:
+            regexps[fmt] = (compiled.pattern, dict(compiled.rebuild))
+    for (fmt, locale), regexp in _CACHED_SHAPE_REGEXP.items():
+        if locale is None:
+            shapes[fmt] = regexp.pattern
+    data = {u'key': format_cache_key(), u'tables': {u'regexp': regexps, u'shape': shapes}}
+    with NamedTemporaryFile(u'w', dir=dirname(abspath(path)), delete=False) as output:
+        dump(data, output)
+    rename(output.name, path)
+
+
+class ShapeIndex(object):
+    u'''
+    Select the formats that might match an input, given its shape.  So, for
+    example, input with no letters is never matched against a format that
+    needs a month name.
+
+    The formats for each shape are found when first needed and then
+    retained (up to `size` shapes).
+    '''
+
+    def __init__(self, formats, size=1000, locale=None):
+        u'''
+        :param formats: The formats (in order).
+        :param size: The number of shapes to retain.
+        :param locale: The locale name (`None` for the process locale).
+        '''
+        self.__formats = tuple((fmt, to_shape_regexp(fmt, locale)) for fmt in formats)
+        self.__candidates = {}
+        self.__size = size
+
+    def candidates(self, data_string):
+        u'''
+        :param data_string: The input to parse.
+        :return: The formats that might match, in order.
+        '''
+        shape = data_string.translate(SHAPE)
+        try:
+            return self.__candidates[shape]
+        except KeyError:
+            candidates = tuple(fmt for fmt, regex in self.__formats if regex.match(shape))
+            if len(self.__candidates) < self.__size:
+                self.__candidates[shape] = candidates
+            return candidates
 
 
 # the main logic to construct a date/time from the matched data, lifted
@@ -299,165 +1077,18 @@ def to_regexp(fmt, substitutions=None):
 # modified handling for y50, and uzing -ve indices for z minutes.
 
 def to_time_tuple(found_dict):
-    u'''Closely based on _strptime in standard Python.'''
-    year = None
-    month = day = 1
-    hour = minute = second = fraction = 0
-    tz = -1
-    tzoffset = None
-    # Default to -1 to signify that values not known; not critical to have
-    week_of_year = -1
-    week_of_year_start = -1
-    # weekday and julian defaulted to -1 so as to signal need to calculate
-    weekday = julian = -1
-    for group_key in (key for key in found_dict.keys() if found_dict[key] is not None):
-        # Directives not explicitly handled below:
-        #   c, x, X
-        #      handled by making out of other directives
-        #   U, W
-        #      worthless without day of the week
-        if group_key == u'y':
-            year = int(found_dict[u'y'])
-            # Open Group specification for strptime() states that a %y
-            #value in the range of [00, 68] is in the century 2000, while
-            #[69,99] is in the century 1900
-            if year <= 68:
-                year += 2000
-            else:
-                year += 1900
-        elif group_key == u'y50':
-            year = int(found_dict[u'y50'])
-            # ASN.1 / RFC 3852
-            if year < 50:
-                year += 2000
-            else:
-                year += 1900
-        elif group_key == u'Y':
-            year = int(found_dict[u'Y'])
-        elif group_key == u'm':
-            month = int(found_dict[u'm'])
-        elif group_key == u'B':
-            month = LOCALE_TIME.f_month.index(found_dict[u'B'].lower())
-        elif group_key == u'b':
-            month = LOCALE_TIME.a_month.index(found_dict[u'b'].lower())
-        elif group_key == u'd':
-            day = int(found_dict[u'd'])
-        elif group_key == u'H':
-            hour = int(found_dict[u'H'])
-        elif group_key == u'I':
-            hour = int(found_dict[u'I'])
-            ampm = found_dict.get(u'p', u'').lower()
-            # If there was no AM/PM indicator, we'll treat this like AM
-            if ampm in (u'', LOCALE_TIME.am_pm[0]):
-                # We're in AM so the hour is correct unless we're
-                # looking at 12 midnight.
-                # 12 midnight == 12 AM == hour 0
-                if hour == 12:
-                    hour = 0
-            elif ampm == LOCALE_TIME.am_pm[1]:
-                # We're in PM so we need to add 12 to the hour unless
-                # we're looking at 12 noon.
-                # 12 noon == 12 PM == hour 12
-                if hour != 12:
-                    hour += 12
-        elif group_key == u'M':
-            minute = int(found_dict[u'M'])
-        elif group_key == u'S':
-            second = int(found_dict[u'S'])
-        elif group_key == u'f':
-            s = found_dict[u'f']
-            # Pad to always return microseconds.
-            s += u"0" * (6 - len(s))
-            fraction = int(s)
-        elif group_key == u'A':
-            weekday = LOCALE_TIME.f_weekday.index(found_dict[u'A'].lower())
-        elif group_key == u'a':
-            weekday = LOCALE_TIME.a_weekday.index(found_dict[u'a'].lower())
-        elif group_key == u'w':
-            weekday = int(found_dict[u'w'])
-            if weekday == 0:
-                weekday = 6
-            else:
-                weekday -= 1
-        elif group_key == u'j':
-            julian = int(found_dict[u'j'])
-        elif group_key in (u'U', u'W'):
-            week_of_year = int(found_dict[group_key])
-            if group_key == u'U':
-                # U starts week on Sunday.
-                week_of_year_start = 6
-            else:
-                # W starts week on Monday.
-                week_of_year_start = 0
-        elif group_key == u'z':
-            z = found_dict[u'z']
-            tzoffset = int(z[1:3]) * 60 + int(z[-2:])
-            if z.startswith(u"-"):
-                tzoffset = -tzoffset
-        elif group_key == u'Z':
-            # Since -1 is default value only need to worry about setting tz if
-            # it can be something other than -1.
-            found_zone = found_dict[u'Z'].lower()
-            for value, tz_values in enumerate(LOCALE_TIME.timezone):
-                if found_zone in tz_values:
-                    # Deal with bad locale setup where timezone names are the
-                    # same and yet time.daylight is true; too ambiguous to
-                    # be able to tell what timezone has daylight savings
-                    if (time.tzname[0] == time.tzname[1] and
-                       time.daylight and found_zone not in (u"utc", u"gmt")):
-                        break
-                    else:
-                        tz = value
-                        break
-    leap_year_fix = False
-    if year is None and month == 2 and day == 29:
-        year = 1904  # 1904 is first leap year of 20th century
-        leap_year_fix = True
-    elif year is None:
-        year = 1900
-    # If we know the week of the year and what day of that week, we can figure
-    # out the Julian day of the year.
-    if julian == -1 and week_of_year != -1 and weekday != -1:
-        week_starts_Mon = True if week_of_year_start == 0 else False
-        julian = _calc_julian_from_U_or_W(year, week_of_year, weekday,
-                                            week_starts_Mon)
-    # Cannot pre-calculate date() since can change in Julian
-    # calculation and thus could have different value for the day of the week
-    # calculation.
-    if julian == -1:
-        # Need to add 1 to result since first day of the year is 1, not 0.
-        julian = date(year, month, day).toordinal() - \
-                  date(year, 1, 1).toordinal() + 1
-    else:  # Assume that if they bothered to include Julian day it will
-           # be accurate.
-        datetime_result = date.fromordinal((julian - 1) + date(year, 1, 1).toordinal())
-        year = datetime_result.year
-        month = datetime_result.month
-        day = datetime_result.day
-    if weekday == -1:
-        weekday = date(year, month, day).weekday()
-    # Add timezone info
-    tzname = found_dict.get(u'Z')
-    if tzoffset is not None:
-        gmtoff = tzoffset * 60
-    else:
-        gmtoff = None
-
-    if leap_year_fix:
-        # the caller didn't supply a year but asked for Feb 29th. We couldn't
-        # use the default of 1900 for computations. We set it back to ensure
-        # that February 29th is smaller than March 1st.
-        year = 1900
-
-    return (year, month, day,
-            hour, minute, second,
-            weekday, julian, tz, tzname, gmtoff), fraction
+    u'''
+    Convert any matched groups to a time tuple and fraction (this builds a
+    new converter each time - see `Converter` for the per-format version).
+    '''
+    return Converter(found_dict)(found_dict)
 
 
-def strptime(data_string, format=u"%a %b %d %H:%M:%S %Y"):
+def strptime(data_string, format=u"%a %b %d %H:%M:%S %Y", locale=None):
     u'''
     Parse the input and return date/time tuple, fractional seconds, and
-    a format that matched the input.
+    a format that matched the input (names are matched for the given
+    locale, or the process locale if `None`).
     '''
 
     for index, arg in enumerate([data_string, format]):
@@ -465,7 +1096,14 @@ def strptime(data_string, format=u"%a %b %d %H:%M:%S %Y"):
             msg = u"strptime() argument {} must be str, not {}"
             raise TypeError(msg.format(index, type(arg)))
 
-    _, rebuild, format_regex = to_regexp(format)
+    parser = FAST_PATHS.get(format) if locale is None else None
+    if parser:
+        result = parser(data_string)
+        if result is not None:
+            return result
+
+    compiled = to_regexp(format, locale=locale)
+    _, rebuild, format_regex = compiled
     found = format_regex.match(data_string)
     if not found:
         raise ValueError(u"time data %r does not match format %r" %
@@ -474,8 +1112,8 @@ def strptime(data_string, format=u"%a %b %d %H:%M:%S %Y"):
         raise ValueError(u"unconverted data remains: %s" %
                           data_string[found.end():])
 
-    date_time, fraction = to_time_tuple(found.groupdict())
-    write_format = reconstruct(rebuild, found.groupdict())
+    date_time, fraction = compiled.converter(found.groupdict())
+    write_format = rebuild(found.groupdict())
 
     return date_time, fraction, write_format
 
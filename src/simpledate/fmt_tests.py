@@ -1,8 +1,18 @@
 
 from unittest import TestCase
 from re import compile
+from threading import Thread
+from tempfile import NamedTemporaryFile
+from json import dump, load
+from os import remove
 from simpledate import DMY
-from simpledate.fmt import _to_regexp, reconstruct, DEFAULT_TO_REGEX, strip, invert, HIDE_CHOICES
+from simpledate.fmt import _to_regexp, reconstruct, DEFAULT_TO_REGEX, strip, invert, HIDE_CHOICES, strptime, matches, to_alternation, to_time_tuple, ShapeIndex, to_regexp, \
+    set_cache_size, cache_info, CACHE_MAX_SIZE, save_format_cache, load_format_cache, _compile_format, \
+    to_shape_regexp, _to_shape_regexp, _STORED, LocaleTables, Localized, locale_tables, _LOCALE_TABLES, \
+    Formatter, formatter
+from locale import Error as LocaleError
+from pytz import utc, timezone
+import datetime as dt
 
 
 class RegexpTest(TestCase):
@@ -68,6 +78,10 @@ class ParserTest(TestCase):
         match = regexp.match(text)
         result = reconstruct(rebuild, match.groupdict())
         assert result == target, result
+        # cached by matched groups
+        result = rebuild(match.groupdict())
+        assert result == target, result
+        assert rebuild(match.groupdict()) is result
 
     def test_reconstruct(self):
         self.assert_reconstruct(u'ab', u'a{b|c}d?', u'ab')
@@ -79,6 +93,199 @@ class ParserTest(TestCase):
         self.assert_reconstruct(u'%%%M!{|}', u'%%%M%!%{%|%}', u'%59!{|}')
 
 
+class MatchesTest(TestCase):
+
+    def assert_matches(self, formats, text):
+        expected = []
+        for fmt in formats:
+            try:
+                expected.append((fmt, strptime(text, fmt)))
+            except ValueError:
+                pass
+        found = [(fmt, convert(found_dict) + (reconstruct(rebuild, found_dict),))
+                 for fmt, rebuild, convert, found_dict in matches(text, formats)]
+        assert found == expected, (found, expected)
+
+    def test_matches(self):
+        formats = (u'%Y%(-%m%)%?', u'%Y%(-%m%(-%d%)%?%)%?', u'%d/%m/%Y', u'%m/%d/%Y', u'%Y-%m-%d %H:%M')
+        for text in (u'2013', u'2013-06', u'2013-06-08', u'08/06/2013', u'13/06/2013', u'2013-06-08 12:34', u'x'):
+            self.assert_matches(formats, text)
+
+    def test_many_groups(self):
+        # too many groups for a single regexp
+        formats = tuple(u'%(' * n + u'%d/%m/%Y' + u'%)%?' * n for n in range(10, 40, 5))
+        assert len(to_alternation(formats)) > 1
+        self.assert_matches(formats, u'08/06/2013')
+        self.assert_matches(formats, u'2013')
+
+
+class ConverterTest(TestCase):
+
+    def assert_converter(self, fmt, text, target):
+        groups = to_regexp(fmt).regexp.match(text).groupdict()
+        result = to_regexp(fmt).converter(groups)
+        assert result == target, result
+        assert result == to_time_tuple(groups), to_time_tuple(groups)
+        (year, month, day, hour, minute, second, weekday, julian, tz, tzname, gmtoff), fraction = target
+        partial = to_regexp(fmt).converter(groups, False)
+        assert partial == ((year, month, day, hour, minute, second, -1, -1, tz, tzname, gmtoff), fraction), partial
+
+    def test_converter(self):
+        self.assert_converter(u'%Y-%m-%d %H:%M:%S.%f %z', u'2013-06-08 12:34:56.5 -0400',
+                              ((2013, 6, 8, 12, 34, 56, 5, 159, -1, None, -14400), 500000))
+        self.assert_converter(u'%d %b %y %I:%M%( %p%)%?', u'8 Jun 13 12:34 pm',
+                              ((2013, 6, 8, 12, 34, 0, 5, 159, -1, None, None), 0))
+        self.assert_converter(u'%d %b %y %I:%M%( %p%)%?', u'8 Jun 13 12:34',
+                              ((2013, 6, 8, 0, 34, 0, 5, 159, -1, None, None), 0))
+        groups = to_regexp(u'%Y %j').regexp.match(u'2013 159').groupdict()
+        assert to_regexp(u'%Y %j').converter(groups, False) == ((2013, 6, 8, 0, 0, 0, -1, 159, -1, None, None), 0)
+
+
+class ShapeIndexTest(TestCase):
+
+    def test_candidates(self):
+        formats = (u'%Y-%m-%d', u'%d %b %Y', u'%Y%!m%!d%!H%!M%!S%(%!Z%|%!z%)', u'%H:%M%( %p%)%?')
+        index = ShapeIndex(formats)
+        assert index.candidates(u'2013-06-08') == formats[:1], index.candidates(u'2013-06-08')
+        assert index.candidates(u'8 Jun 2013') == formats[1:2], index.candidates(u'8 Jun 2013')
+        assert index.candidates(u'20130706062100Z') == formats[2:3], index.candidates(u'20130706062100Z')
+        assert index.candidates(u'12:34') == formats[3:], index.candidates(u'12:34')
+        assert index.candidates(u'12:34 pm') == formats[3:], index.candidates(u'12:34 pm')
+        assert index.candidates(u'not a date') == (), index.candidates(u'not a date')
+        # the same shape gives the same answer
+        assert index.candidates(u'1999-12-31') == formats[:1], index.candidates(u'1999-12-31')
+
+
+class CacheTest(TestCase):
+
+    def test_threads(self):
+        # compiling is re-entrant, so concurrent misses give the right regexp.
+        formats = [u'%Y' + u'-' * n + u'%m%( %H%)%?' for n in range(1, 50)]
+        expected = [_to_regexp(fmt)[0] for fmt in formats]
+        errors = []
+        def compile_all():
+            for fmt, target in zip(formats, expected):
+                if to_regexp(fmt).pattern != target:
+                    errors.append(fmt)
+        threads = [Thread(target=compile_all) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors[:3]
+
+    def test_size(self):
+        try:
+            set_cache_size(2)
+            for fmt in (u'%Y', u'%m', u'%d', u'%Y'):
+                to_regexp(fmt)
+            info = cache_info()[u'regexp']
+            assert info.maxsize == 2 and info.currsize == 2, info
+            hits = info.hits
+            to_regexp(u'%Y')
+            assert cache_info()[u'regexp'].hits == hits + 1, cache_info()
+        finally:
+            set_cache_size(CACHE_MAX_SIZE)
+
+
+class FormatCacheTest(TestCase):
+
+    def test_round_trip(self):
+        fmt = u'%d %b %Y%( %H:%M%)%?'
+        compiled, shape = to_regexp(fmt), to_shape_regexp(fmt)
+        with NamedTemporaryFile(delete=False) as output:
+            path = output.name
+        try:
+            save_format_cache(path)
+            with open(path) as input:
+                data = load(input)
+            assert data[u'tables'][u'regexp'][fmt] == [compiled.pattern, dict(compiled.rebuild)]
+            assert data[u'tables'][u'shape'][fmt] == shape.pattern
+            # stored values are used in place of compiling from scratch
+            data[u'tables'][u'regexp'][u'%Y!'] = [u'(?P<Y>\\d\\d\\d\\d)!!', {u'G0': u'%Y!!'}]
+            data[u'tables'][u'shape'][u'%Y!'] = u'0000!!\\Z'
+            with open(path, u'w') as output:
+                dump(data, output)
+            assert load_format_cache(path)
+            result = _compile_format(u'%Y!', None)
+            assert result.pattern == u'(?P<Y>\\d\\d\\d\\d)!!', result.pattern
+            assert result.rebuild({u'Y': u'2013'}) == u'%Y!!', result.rebuild
+            assert _to_shape_regexp(u'%Y!').match(u'0000!!')
+            # but not if the key differs
+            data[u'key'] = u'other'
+            with open(path, u'w') as output:
+                dump(data, output)
+            assert not load_format_cache(path)
+            assert not load_format_cache(path + u'.missing')
+        finally:
+            remove(path)
+            _STORED[u'regexp'].pop(u'%Y!', None)
+            _STORED[u'shape'].pop(u'%Y!', None)
+
+
+class SpanishTables(LocaleTables):
+
+    class time(object):
+        lang = (u'es_ES', u'UTF-8')
+        a_weekday = [u'lun', u'mar', u'mi\xe9', u'jue', u'vie', u's\xe1b', u'dom']
+        f_weekday = [u'lunes', u'martes', u'mi\xe9rcoles', u'jueves', u'viernes', u's\xe1bado', u'domingo']
+        a_month = [u'', u'ene', u'feb', u'mar', u'abr', u'may', u'jun', u'jul', u'ago', u'sep', u'oct', u'nov', u'dic']
+        f_month = [u'', u'enero', u'febrero', u'marzo', u'abril', u'mayo', u'junio', u'julio', u'agosto',
+                   u'septiembre', u'octubre', u'noviembre', u'diciembre']
+        am_pm = [u'', u'']
+        LC_date_time = u'%a %d %b %Y %T'
+        LC_date = u'%d/%m/%y'
+        LC_time = u'%T'
+
+
+class LocaleTest(TestCase):
+
+    def test_lazy(self):
+        assert isinstance(DEFAULT_TO_REGEX[u'%b'], Localized)
+        assert locale_tables(u'C') is locale_tables(u'C')
+        assert locale_tables(u'C') is not locale_tables()
+
+    def test_locales(self):
+        _LOCALE_TABLES[u'es_TEST'] = SpanishTables(u'es_TEST')
+        try:
+            tt, _, _ = strptime(u's\xe1b 8 ene 2013', u'%a %d %b %Y', locale=u'es_TEST')
+            assert tt[:3] == (2013, 1, 8), tt
+            tt, _, _ = strptime(u'Tue 8 Jan 2013', u'%a %d %b %Y', locale=u'C')
+            assert tt[:3] == (2013, 1, 8), tt
+            self.assertRaises(ValueError, strptime, u'8 Jan 2013', u'%d %b %Y', locale=u'es_TEST')
+            self.assertRaises(ValueError, strptime, u'8 ene 2013', u'%d %b %Y', locale=u'C')
+        finally:
+            del _LOCALE_TABLES[u'es_TEST']
+
+    def test_unknown(self):
+        self.assertRaises(LocaleError, strptime, u'8 Jan 2013', u'%d %b %Y', locale=u'xx_UNKNOWN')
+        del _LOCALE_TABLES[u'xx_UNKNOWN']
+
+
+class FormatterTest(TestCase):
+
+    def test_strftime(self):
+        zones = [None, utc, timezone(u'America/Santiago'), timezone(u'Asia/Kolkata')]
+        formats = [u'%Y-%m-%d %H:%M:%S.%f %Z', u'%y%j %I%%%z', u'%Y {0} %d', u'%a %d %b', u'%Y-%m-%d%Q', u'%Y%']
+        for year in (1899, 2013):
+            for zone in zones:
+                datetime = dt.datetime(year, 6, 8, 15, 4, 5, 6789)
+                if zone:
+                    datetime = zone.localize(datetime)
+                for format in formats:
+                    try:
+                        expected = datetime.strftime(format)
+                    except ValueError:
+                        self.assertRaises(ValueError, Formatter(format), datetime)
+                    else:
+                        assert Formatter(format)(datetime) == expected, (format, datetime, expected)
+
+    def test_compiled(self):
+        assert formatter(u'%Y-%m-%d %Z') is formatter(u'%Y-%m-%d %Z')
+        assert formatter(u'%Y-%m-%d %Z').template == u'{0.year}-{0.month:02}-{0.day:02} {1}'
+        assert formatter(u'%a %Y').template is None  # names depend on the locale
+
+
 class StripTest(TestCase):
 
     def test_strip(self):
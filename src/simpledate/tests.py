@@ -1,10 +1,20 @@
 
 from __future__ import with_statement
 from unittest import TestCase
-from pytz import timezone, utc
-from simpledate import SimpleDate, SimpleDateError, SimpleDateParser, DMY, MRUSortedIterable, DEFAULT_FORMAT, DEFAULT_DATE_PARSER, DEFAULT_TZ_FACTORY, take, NoTimezone, AmbiguousTimezone, SingleInstantTz, prefer, tzinfo_utcoffset, best_guess_utc, MDY, invert, ISO_8601
+from pytz import timezone, utc, AmbiguousTimeError, NonExistentTimeError
+from simpledate import SimpleDate, SimpleDateError, SimpleDateParser, DMY, MRUSortedIterable, DEFAULT_FORMAT, DEFAULT_DATE_PARSER, DEFAULT_TZ_FACTORY, take, NoTimezone, AmbiguousTimezone, SingleInstantTz, SingleInstantTzError, PeriodTz, PeriodTzError, prefer, tzinfo_utcoffset, best_guess_utc, MDY, invert, ISO_8601, AbbreviationIndex, tzinfo_tzname, tzinfo_timeline, PyTzFactory, LazyInstance, ParseFailure, best_guess_many, datetime_epoch_us, format_many
+from simpledate.bulk import byte_ranges, parse_file
+import simpledate.bulk as bulk
+from simpledate.fmt import formatter, LocaleTables, _SETLOCALE_LOCK
+from simpledate.utils import NamedOffset
 import datetime as dt
 import time as t
+from random import Random
+from operator import attrgetter
+from threading import Thread
+from tempfile import NamedTemporaryFile
+from os import remove
+from logging import getLogger, Handler, DEBUG, NOTSET
 
 
 DEBUG = True
@@ -159,6 +169,28 @@ class ParserTest(TestCase):
         with self.assertRaisesRegex(SimpleDateError, u'Could not parse'):
             SimpleDate(u'50111111111Z')  # one digit shorter than above
 
+    def test_parse_many(self):
+        dates = [u'2013-06-08 12:34:56 EDT', u'2013-06-09 01:02:03 EDT', u'2013-01-08 12:34 EST',
+                 u'Tue, 18 Jun 2013 12:19:09 -0400', u'garbage', u'2013-02-30 12:00 EST', u'2013-06-08 12:34:56 XYZ']
+        results = list(DEFAULT_DATE_PARSER.parse_many(dates, country=u'US'))
+        assert len(results) == len(dates), results
+        for date, result in zip(dates, results):
+            try:
+                datetime, _, fmt = DEFAULT_DATE_PARSER.parse(date, country=u'US')
+            except SimpleDateError, e:
+                assert isinstance(result, ParseFailure) and not result, result
+                assert result.date == date and unicode(result.error) == unicode(e), result
+            else:
+                assert result == (datetime, fmt), (result, datetime, fmt)
+
+    def test_parse_many_bad_zone(self):
+        # the offset from the first format is out of range, so the second is used.
+        parser = SimpleDateParser((u'%Y-%m-%d %z', u'%Y-%m-%d +%M%S'))
+        datetime, _, fmt = parser.parse(u'2013-06-08 +2400', tz=utc)
+        assert fmt == u'%Y-%m-%d +%M%S', fmt
+        results = list(parser.parse_many([u'2013-06-08 +2400'], tz=utc))
+        assert results == [(datetime, fmt)], results
+
     def test_rfc3339(self):
         # http://www.lshift.net/blog/2010/05/20/rfc3339-simple-canonical-date-parsing-and-formatting-for-python
         midnightUTC = SimpleDate(u"2008-08-24T00:00:00Z").normalized
@@ -171,9 +203,32 @@ class TZFactoryTest(TestCase):
         with self.assertRaisesRegex(AmbiguousTimezone, u"2 distinct timezones"):
             DEFAULT_TZ_FACTORY.search(datetime=dt.datetime(2012, 5, 19, 12), country=u'CL', debug=DEBUG)
         tz = DEFAULT_TZ_FACTORY.search(u'EDT', datetime=dt.datetime(2012, 5, 19, 12), country=u'US', debug=DEBUG)
-        assert repr(tz) == u"SingleInstantTz(datetime.timedelta(-1, 72000), 'EDT', datetime.datetime(2012, 5, 19, 16, 0, tzinfo=<UTC>))", repr(tz)
+        assert isinstance(tz, PeriodTz) and unicode(tz) == u'EDT', repr(tz)
+        assert tz.utcoffset(dt.datetime(2012, 5, 19, 12)) == dt.timedelta(hours=-4), repr(tz)
         tz = DEFAULT_TZ_FACTORY.search(u'EDT', datetime=dt.datetime(2012, 5, 19, 12), debug=DEBUG)
-        assert repr(tz) == u"SingleInstantTz(datetime.timedelta(-1, 72000), 'EDT', datetime.datetime(2012, 5, 19, 16, 0, tzinfo=<UTC>))", repr(tz)
+        assert isinstance(tz, PeriodTz) and unicode(tz) == u'EDT', repr(tz)
+
+    def test_period(self):
+        summer = [SimpleDate(u'2013-06-%02d 12:34 EDT' % day) for day in range(1, 29)]
+        assert len(set(id(date.tzinfo) for date in summer)) == 1, summer
+        later = summer[0] + dt.timedelta(days=90)
+        assert unicode(later) == u'2013-08-30 12:34 EDT', later
+        assert unicode(later.utc) == u'2013-08-30 16:34 UTC', later.utc
+        with self.assertRaises(PeriodTzError):
+            unicode(summer[0] + dt.timedelta(days=180))
+        winter = DEFAULT_TZ_FACTORY.search(u'EST', country=u'US', datetime=dt.datetime(2013, 1, 1))
+        assert winter is not summer[0].tzinfo and unicode(winter) == u'EST', repr(winter)
+
+    def test_single_instant(self):
+        at = dt.datetime(2013, 6, 8, 12, 34, 56, 789, tzinfo=utc)
+        tz = SingleInstantTz(timezone(u'America/New_York'), at, None)
+        local = at.astimezone(tz)
+        assert unicode(local) == u'2013-06-08 08:34:56.000789-04:00', local
+        assert tz.utcoffset(at.replace(tzinfo=None)) == dt.timedelta(hours=-4)
+        with self.assertRaises(SingleInstantTzError):
+            unicode(local + dt.timedelta(microseconds=1))
+        with self.assertRaises(SingleInstantTzError):
+            tz.utcoffset(local.replace(tzinfo=None))
 
     def test_epoch0_bug(self):
         with self.assertRaisesRegex(SimpleDateError, u"No timezone found"):
@@ -206,9 +261,79 @@ class TZFactoryTest(TestCase):
         # it to differ from the Australian ones
         assert offset_nsw != offset_qns != offset_est != offset_nsw
 
+    def test_index(self):
+        ny, london = timezone(u'America/New_York'), timezone(u'Europe/London')
+        index = AbbreviationIndex([ny, london])
+        assert ny in index.candidates(u'EDT', dt.datetime(2013, 6, 1))
+        assert london not in index.candidates(u'EDT', dt.datetime(2013, 6, 1))
+        assert ny not in index.candidates(u'EDT', dt.datetime(2013, 1, 1))
+        assert not index.candidates(u'XYZ', dt.datetime(2013, 1, 1))
+        # either side of the transition, both naive and aware
+        for datetime in (dt.datetime(2013, 11, 3, 0, 59), dt.datetime(2013, 11, 3, 1, 30), dt.datetime(2013, 11, 3, 2, 1),
+                         dt.datetime(2013, 11, 3, 5, 59, tzinfo=utc), dt.datetime(2013, 11, 3, 6, 1, tzinfo=utc)):
+            for name in (u'EST', u'EDT'):
+                for is_dst in (False, True):
+                    found = list(DEFAULT_TZ_FACTORY.expand_tz(name, datetime=datetime, is_dst=is_dst))
+                    assert ny in found or tzinfo_tzname(ny, datetime, is_dst) != name, (name, datetime, is_dst)
+                    for tzinfo in found:
+                        assert tzinfo_tzname(tzinfo, datetime, is_dst) == name, (tzinfo, name, datetime, is_dst)
+
+    def test_timeline(self):
+        # either side of the 2012 transitions in Chile, where the clocks went
+        # back at midnight on 28 April and forwards on 2 September.
+        tz = timezone(u'America/Santiago')
+        timeline = tzinfo_timeline(tz)
+        assert timeline is tzinfo_timeline(tz.localize(dt.datetime(2013, 1, 1)).tzinfo)
+        for datetime in (dt.datetime(2012, 4, 28, 23, 30), dt.datetime(2012, 4, 29, 0, 30),
+                         dt.datetime(2012, 9, 2, 0, 30), dt.datetime(2012, 9, 2, 1, 30),
+                         dt.datetime(2012, 4, 29, 2, 30, tzinfo=utc), dt.datetime(2012, 4, 29, 3, 30, tzinfo=utc)):
+            for is_dst in (False, True, None):
+                naive = datetime.astimezone(tz).replace(tzinfo=None) if datetime.tzinfo else datetime
+                try:
+                    target = tz.tzname(naive, is_dst), tz.utcoffset(naive)
+                except (AmbiguousTimeError, NonExistentTimeError), e:
+                    with self.assertRaises(e.__class__):
+                        tzinfo_tzname(tz, datetime, is_dst) if is_dst is None else tzinfo_utcoffset(tz, datetime)
+                else:
+                    result = tzinfo_tzname(tz, datetime, is_dst), tzinfo_utcoffset(tz, datetime)
+                    assert result == target, (datetime, is_dst, result, target)
+
+    def test_search_cache(self):
+        factory = PyTzFactory(countries=[u'US', u'GB'], cache_size=4)
+        uncached = PyTzFactory(countries=[u'US', u'GB'])
+        # a whole summer shares one entry
+        for month in (5, 6, 7, 8, 9):
+            tz = factory.search(u'EDT', datetime=dt.datetime(2013, month, 1))
+            assert dt.datetime(2013, month, 1, tzinfo=tz).utcoffset() == dt.timedelta(hours=-4), tz
+        info = factory.cache_info()
+        assert info.hits == 4 and info.misses == 1 and info.currsize == 1, info
+        # either side of the transitions, both naive and aware
+        for datetime in (dt.datetime(2013, 3, 10, 1, 59), dt.datetime(2013, 3, 10, 2, 30), dt.datetime(2013, 3, 10, 3, 0),
+                         dt.datetime(2013, 11, 3, 0, 59), dt.datetime(2013, 11, 3, 1, 30), dt.datetime(2013, 11, 3, 2, 0),
+                         dt.datetime(2013, 11, 3, 5, 59, tzinfo=utc), dt.datetime(2013, 11, 3, 6, 0, tzinfo=utc)):
+            for is_dst in (False, True):
+                for _ in range(2):
+                    try:
+                        target = repr(uncached.search((u'EST', u'EDT'), datetime=datetime, is_dst=is_dst, country=u'US'))
+                    except (AmbiguousTimeError, NonExistentTimeError), e:
+                        with self.assertRaises(e.__class__):
+                            factory.search((u'EST', u'EDT'), datetime=datetime, is_dst=is_dst, country=u'US')
+                    else:
+                        result = repr(factory.search((u'EST', u'EDT'), datetime=datetime, is_dst=is_dst, country=u'US'))
+                        assert result == target, (datetime, is_dst, result, target)
+        info = factory.cache_info()
+        assert info.currsize == 4 and info.evictions > 0, info
+
 
 class FixedTimeTimezoneTest(TestCase):
 
+    def test_named_offset(self):
+        tz = NamedOffset(dt.timedelta(hours=-4), u'EDT')
+        datetime = tz.localize(dt.datetime(2013, 6, 8, 12, 34))
+        assert datetime.strftime(u'%H:%M %Z') == u'12:34 EDT', datetime.strftime(u'%H:%M %Z')
+        assert unicode(datetime.astimezone(utc)) == u'2013-06-08 16:34:00+00:00', datetime.astimezone(utc)
+        assert tz.normalize(datetime.astimezone(utc)) == datetime and unicode(tz) == u'EDT'
+
     def test_from(self):
         date = SimpleDate(2013, 2, 2, tz=u'CLST', debug=DEBUG)
         tz = timezone(u'America/New_York')
@@ -326,6 +451,28 @@ class MethodTest(TestCase):
         assert unicode(date) == u'2013-06-01 12:34:00.000000 PDT', unicode(date)
         assert SimpleDate(u'2013-06-01 12:34:00.000000 PDT').timestamp == n, SimpleDate(u'2013-06-01 12:34:00.000000 PDT').timestamp
 
+    def test_from_aware(self):
+        datetime = timezone(u'America/New_York').localize(dt.datetime(2013, 6, 8, 12, 34, 56, 789000))
+        date = SimpleDate.from_aware(datetime, u'%Y-%m-%d %H:%M %Z')
+        assert date == SimpleDate(datetime, format=u'Y-m-d H:M Z'), date
+        assert unicode(date) == u'2013-06-08 12:34 EDT', date
+        self.assertRaises(SimpleDateError, SimpleDate.from_aware, datetime.replace(tzinfo=None))
+        date = SimpleDate.from_epoch_us(1370709296789000, timezone(u'America/New_York'))
+        assert date == SimpleDate(timestamp=1370709296.789, tz=timezone(u'America/New_York')), date
+        assert date.datetime == datetime, date
+        assert unicode(date.convert(format=u'Y-m-d')) == u'2013-06-08', date.convert(format=u'Y-m-d')
+        assert unicode(date + dt.timedelta(days=1)) == u'2013-06-09 12:34:56.789000 EDT', date + dt.timedelta(days=1)
+        assert (date.naive + dt.timedelta(days=1)).tzinfo is not None
+
+    def test_format_many(self):
+        dates = [SimpleDate(u'2013-06-08 12:34:56.789 EDT'), None, SimpleDate(u'2013-06-08', tz=u'PDT')]
+        strings = format_many(dates)
+        assert strings == [u'2013-06-08 12:34:56.789000 EDT', None, u'2013-06-08'], strings
+        strings = format_many(dates, u'Y/m/d H:M Z')
+        assert strings == [u'2013/06/08 12:34 EDT', None, u'2013/06/08 00:00 PDT'], strings
+        strings = format_many([date.datetime for date in dates if date], u'%d %b %Y')
+        assert strings == [u'08 Jun 2013', u'08 Jun 2013'], strings
+
         
 class OperationsTest(TestCase):
     
@@ -357,6 +504,25 @@ class OperationsTest(TestCase):
         # assert delta == date.tz.utcoffset(date.utc.naive.datetime), (delta, date.tz.utcoffset(date.utc.naive.datetime))
         assert delta.total_seconds() == -14400, delta.total_seconds()
 
+    def test_hash_and_order(self):
+        edt = SimpleDate(u'2013-06-08 12:34:56 EDT')
+        new_york = SimpleDate(u'2013-06-08 12:34:56 America/New_York')
+        utc_date = SimpleDate(u'2013-06-08 16:34:56 UTC')
+        later = SimpleDate(u'2013-06-08 16:34:57 UTC')
+        assert edt == new_york == utc_date and not edt != utc_date
+        assert len(set([edt, new_york, utc_date, later])) == 2
+        assert edt.sort_key == (1370709296000000, u'%Y-%m-%d %H:%M:%S %Z', u'EDT'), edt.sort_key
+        # equal values are neither less nor greater, and sorting is stable.
+        assert not edt < new_york and not new_york < edt and not edt > utc_date and not utc_date > edt
+        assert edt <= new_york <= edt and utc_date >= edt >= utc_date
+        assert edt < later and later > utc_date and not later <= edt and not edt >= later
+        result = sorted([later, utc_date, new_york, edt])
+        assert [id(date) for date in result] == [id(utc_date), id(new_york), id(edt), id(later)], result
+        result = sorted([later, utc_date, new_york, edt], key=attrgetter(u'sort_key'))
+        assert [id(date) for date in result] == [id(new_york), id(edt), id(utc_date), id(later)], result
+        assert [date.sort_key for date in result] == sorted(date.sort_key for date in result)
+        assert utc_date.convert(format=u'Y') != utc_date
+
 
 class BestGuessUtcTest(TestCase):
 
@@ -371,6 +537,60 @@ class BestGuessUtcTest(TestCase):
         self.assert_utc(u'1/6/2013 BST', dt.datetime(2013, 5, 31, 23))
         self.assert_utc(u'Tue, 18 Jun 2013 12:19:09 -0400', dt.datetime(2013, 6, 18, 16, 19, 9))
 
+    def test_many(self):
+        dates = [u'1/6/2013 UTC', u'1/6/2013 BST', u'not a date', u'25/12/2013 12:00 Europe/London']
+        results = best_guess_many(dates)
+        assert [result.astimezone(utc) for result in results if result] == \
+               [best_guess_utc(date) for date in dates if date != u'not a date'], results
+        assert isinstance(results[2], ParseFailure), results[2]
+
+
+class BulkTest(TestCase):
+
+    def test_file(self):
+        dates = [u'1/6/2013 UTC', u'1/6/2013 BST', u'', u'not a date', u'25/12/2013 12:00 Europe/London'] * 5
+        with NamedTemporaryFile(delete=False) as output:
+            output.write(u'\n'.join(dates).encode(u'utf8'))
+        try:
+            ranges = byte_ranges(output.name, 30)
+            assert len(ranges) > 1, ranges
+            assert ranges[0][0] == 0 and all(a[1] == b[0] for a, b in zip(ranges, ranges[1:])), ranges
+            results = list(parse_file(output.name, processes=2, chunk_size=30))
+            assert len(results) == len(dates), results
+            for date, result in zip(dates, results):
+                if date and date != u'not a date':
+                    utc_datetime = best_guess_utc(date)
+                    assert result[0] == datetime_epoch_us(utc_datetime), (date, result)
+                else:
+                    assert result is None, (date, result)
+            assert results[1][1] == 3600, results[1]
+        finally:
+            remove(output.name)
+
+    def test_worker_error(self):
+        def fail(dates):
+            raise NoTimezone([u'XYZ'], None, False, None, False)  # cannot be unpickled
+        errors = []
+        def run():
+            try:
+                list(parse_file(output.name, processes=2, chunk_size=30))
+            except Exception, e:
+                errors.append(e)
+        with NamedTemporaryFile(delete=False) as output:
+            output.write(u'\n'.join([u'1/6/2013 UTC'] * 10).encode(u'utf8'))
+        original, bulk.best_guess_many = bulk.best_guess_many, fail  # inherited by the workers
+        try:
+            thread = Thread(target=run)
+            thread.daemon = True
+            thread.start()
+            thread.join(30)
+            assert not thread.is_alive(), u'parse_file did not return'
+        finally:
+            bulk.best_guess_many = original
+            remove(output.name)
+        assert len(errors) == 1 and isinstance(errors[0], RuntimeError), errors
+        assert u'No timezone found' in unicode(errors[0]), errors[0]
+
 
 class DocsTest(TestCase):
 
@@ -401,6 +621,123 @@ class MRUSortedIterableTest(TestCase):
         assert iterable._data == [4,2,1,3], iterable._data
 
 
+class LazyInstanceTest(TestCase):
+
+    def test_lazy(self):
+        calls = []
+        lazy = LazyInstance(lambda: calls.append(1) or [1, 2, 3])
+        assert not lazy.built and not calls
+        assert lazy.index(2) == 1
+        assert lazy.count(3) == 1
+        assert lazy.built and calls == [1], calls
+        assert DEFAULT_TZ_FACTORY.search(u'Europe/London') is timezone(u'Europe/London')
+
+    def test_defaults(self):
+        assert isinstance(DEFAULT_TZ_FACTORY, PyTzFactory), repr(DEFAULT_TZ_FACTORY)
+        assert isinstance(DEFAULT_DATE_PARSER, SimpleDateParser), repr(DEFAULT_DATE_PARSER)
+        factory = PyTzFactory()
+        assert not factory._PyTzFactory__zones.built
+        assert factory.search(u'Europe/London') is timezone(u'Europe/London')
+        assert not factory._PyTzFactory__zones.built  # full names need no expansion
+        assert unicode(factory.search(u'EDT', datetime=dt.datetime(2013, 6, 8))) == u'EDT'
+        assert factory._PyTzFactory__zones.built
+
+
+class LoggingTest(TestCase):
+
+    def test_logger(self):
+        messages = []
+        class Collect(Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+        logger, handler = getLogger(u'simpledate.PyTzFactory'), Collect()
+        assert not DEFAULT_TZ_FACTORY._get_log(False)
+        logger.addHandler(handler)
+        logger.setLevel(DEBUG)
+        try:
+            assert DEFAULT_TZ_FACTORY._get_log(False)
+            SimpleDate(u'2013-06-08 12:34 EDT')
+            assert any(message.startswith(u'Searching') for message in messages), messages
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(NOTSET)
+        assert not DEFAULT_TZ_FACTORY._get_log(False)
+
+
+class ThreadTest(TestCase):
+
+    def test_shared(self):
+        # the default parser and factory are shared by all threads.
+        dates = [(u'2013-06-08 12:34:56 EDT', u'US'), (u'2013-01-08 12:34 EST', None), (u'2013-06-08T12:34:56Z', None),
+                 (u'Tue, 18 Jun 2013 12:19:09 -0400', None), (u'2013-06-08 12:34:56 BST', u'GB')]
+        zones = [(u'EDT', dt.datetime(2013, 6, 1), u'US'), (u'GMT', dt.datetime(2013, 1, 1), u'GB'),
+                 (u'CET', dt.datetime(2013, 1, 1), u'FR'), (u'AEST', dt.datetime(2013, 6, 1), u'AU')]
+        def parse(date, country):
+            return repr(DEFAULT_DATE_PARSER.parse(date, country=country))
+        def search(tz, datetime, country):
+            return repr(DEFAULT_TZ_FACTORY.search(tz, datetime=datetime, country=country))
+        calls = [(parse, args) for args in dates] + [(search, args) for args in zones]
+        expected = [call(*args) for call, args in calls]
+        errors = []
+        def hammer(seed):
+            order = list(range(len(calls))) * 20
+            Random(seed).shuffle(order)
+            for i in order:
+                call, args = calls[i]
+                try:
+                    result = call(*args)
+                    if result != expected[i]:
+                        errors.append((args, result, expected[i]))
+                except Exception, e:
+                    errors.append((args, e))
+        threads = [Thread(target=hammer, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors[:3]
+
+    def test_locale(self):
+        # finding the names for a named locale switches the process locale,
+        # so strftime (for names, which depend on the locale) must wait.
+        datetime = dt.datetime(2013, 6, 8)
+        results = []
+        thread = Thread(target=lambda: results.append(formatter(u'%a %d %b')(datetime)))
+        with _SETLOCALE_LOCK:
+            thread.start()
+            thread.join(0.1)
+            assert thread.is_alive() and not results, results
+        thread.join()
+        assert results == [u'Sat 08 Jun'], results
+        # but formatting threads share the lock, so do not wait for each other.
+        _SETLOCALE_LOCK.acquire_shared()
+        try:
+            thread = Thread(target=lambda: results.append(formatter(u'%a %d %b')(datetime)))
+            thread.start()
+            thread.join(5)
+            assert not thread.is_alive() and len(results) == 2, results
+        finally:
+            _SETLOCALE_LOCK.release_shared()
+        errors = []
+        def hammer(seed):
+            for i in range(50):
+                try:
+                    if (seed + i) % 2:
+                        names = LocaleTables(u'C').names(u'a_weekday')  # new tables, so switches locale
+                        assert names[5] == u'sat', names
+                    else:
+                        result = formatter(u'%a %d %b')(datetime)
+                        assert result == u'Sat 08 Jun', result
+                except Exception, e:
+                    errors.append(e)
+        threads = [Thread(target=hammer, args=(seed,)) for seed in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors[:3]
+
+
 class StackOverflowTest(TestCase):
 
     def test_17248250(self):
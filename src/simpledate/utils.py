@@ -1,5 +1,9 @@
 
-from collections import MutableSet
+from bisect import bisect_right, insort
+import datetime as dt
+from collections import MutableSet, OrderedDict, deque, namedtuple
+from logging import getLogger, DEBUG
+from threading import Condition, Lock, local
 
 
 class MRUSortedIterable(object):
@@ -7,7 +11,8 @@ class MRUSortedIterable(object):
     An iterable that re-orders the contents to move the most recently used item
     (the last accessed on the previous iteration) to the start of the sequence.
 
-    IMPORTANT: Not thread safe.
+    The contents are shared (and never modified); each thread has its own
+    ordering, so an instance can be used from several threads at once.
     '''
 
     def __init__(self, data):
@@ -15,60 +20,381 @@ class MRUSortedIterable(object):
         :param data: The data to iterate over.
         :return: An iterable that adapts to provide MRU values first.
         '''
-        self._data = list(data)
-        self._i = 0
+        self.__shared = tuple(data)
+        self.__local = local()
+
+    def __state(self):
+        u'''
+        :return: The ordering (`data`) and last accessed index (`i`) for the
+                 current thread.
+        '''
+        state = self.__local
+        if not hasattr(state, u'data'):
+            state.data, state.i = list(self.__shared), 0
+        return state
+
+    @property
+    def _data(self):
+        return self.__state().data
+
+    @property
+    def _i(self):
+        return self.__state().i
 
     def __iter__(self):
         u'''
         :return: A new iterator.
         '''
-        # the iterator records the last accessed value in `_i`.  when a new
+        # the iterator records the last accessed value in `i`.  when a new
         # iterable is requested that points to the last returned (and
         # presumably used) value.  so at that point we can re-order the data.
-        if self._i:
-            self._data[0], self._data[1:self._i+1] = self._data[self._i], self._data[0:self._i]
-        for self._i, value in enumerate(self._data):
+        state = self.__state()
+        data = state.data
+        if state.i:
+            data[0], data[1:state.i+1] = data[state.i], data[0:state.i]
+        for state.i, value in enumerate(data):
             yield value
             # reset on exhaustion.  usefully, this means that the final value was
         # not OK, so another value was requested.  in this way we can avoid
         # promoting the last value when no value was used.
-        self._i = 0
+        state.i = 0
 
 
-class DebugLog(object):
+# the library version (the only copy; setup.py reads it from here).
+VERSION = u'0.4.7'
+
+
+CacheInfo = namedtuple(u'CacheInfo', u'hits misses evictions maxsize currsize')
+
+
+class IntervalCache(object):
     u'''
-    Base class supporting a simple log to stdout for debugging.  Is it possible
-    to use Python logging and do the same thing?
+    A bounded LRU cache where each entry is valid over an interval [lo, hi)
+    of some ordered value (typically time), so a lookup with any value in
+    the interval is a hit.  Intervals for the same key must not overlap.
+
+    Access is serialized by a lock (held only briefly), so an instance can
+    be shared between threads.
     '''
 
-    def _get_log(self, debug):
+    def __init__(self, maxsize):
         u'''
-        :param debug: True to enable logging.
-        :return: A logger that will print to stdout if `debug` is `True`
+        :param maxsize: The maximum number of entries (intervals) retained.
+        :return: A new, empty cache.
         '''
-        return self._log if debug else self._drop
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # (key, lo) -> (hi, value), oldest first
+        self._starts = {}  # key -> sorted lo values
+        self._lock = Lock()
 
-    def _log(self, template, *args, **kargs):
+    def get(self, key, point, default=None):
         u'''
-        A logger that prints to stdout.
+        :param key: The key the value was stored under.
+        :param point: A value within the interval of interest.
+        :param default: Returned on a miss.
+        :return: The value stored for an interval containing `point`.
+        '''
+        with self._lock:
+            starts = self._starts.get(key)
+            if starts:
+                i = bisect_right(starts, point) - 1
+                if i >= 0:
+                    entry = (key, starts[i])
+                    hi, value = self._entries.pop(entry)
+                    self._entries[entry] = (hi, value)  # now most recent
+                    if point < hi:
+                        self.hits += 1
+                        return value
+            self.misses += 1
+            return default
+
+    def put(self, key, lo, hi, value):
+        u'''
+        :param key: The key to store the value under.
+        :param lo: The start of the interval over which the value is valid.
+        :param hi: The end (exclusive) of the interval.
+        :param value: The value to store.
+        '''
+        if not self.maxsize:
+            return
+        with self._lock:
+            entry = (key, lo)
+            if self._entries.pop(entry, None) is None:
+                insort(self._starts.setdefault(key, []), lo)
+            self._entries[entry] = (hi, value)
+            while len(self._entries) > self.maxsize:
+                (key, lo), _ = self._entries.popitem(last=False)
+                starts = self._starts[key]
+                starts.remove(lo)
+                if not starts:
+                    del self._starts[key]
+                self.evictions += 1
+
+    def clear(self):
+        u'''
+        Discard all entries (the counters are retained).
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._starts.clear()
+
+    def info(self):
+        u'''
+        :return: Statistics, as a `CacheInfo` named tuple.
+        '''
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+
+class SharedLock(object):
+    u'''
+    A lock that can be held by many readers at once (`acquire_shared`), or
+    by a single writer (`acquire`, or `with`).  A waiting writer blocks new
+    readers, so cannot be starved.
+    '''
+
+    def __init__(self):
+        self.__condition = Condition(Lock())
+        self.__readers = 0
+        self.__writing = False
+
+    def acquire_shared(self):
+        with self.__condition:
+            while self.__writing:
+                self.__condition.wait()
+            self.__readers += 1
+
+    def release_shared(self):
+        with self.__condition:
+            self.__readers -= 1
+            if not self.__readers:
+                self.__condition.notify_all()
+
+    def acquire(self):
+        with self.__condition:
+            while self.__writing:
+                self.__condition.wait()
+            self.__writing = True
+            while self.__readers:
+                self.__condition.wait()
+
+    def release(self):
+        with self.__condition:
+            self.__writing = False
+            self.__condition.notify_all()
 
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *args):
+        self.release()
+
+
+class ComputedCache(object):
+    u'''
+    A bounded cache of the results of a function, for values that are
+    read far more often than they are added (eg compiled formats).
+
+    Hits do not take a lock (they are a single dict lookup).  On a miss the
+    function is called without any lock held (so it may itself use this or
+    other caches); the lock is taken only to add the result and evict the
+    oldest entry (so eviction is first-in, first-out rather than LRU).  If
+    two threads miss on the same key, both compute a value but the first
+    stored is returned to both.
+
+    The hit count is updated without the lock, so may be slightly low when
+    many threads share the cache.
+    '''
+
+    def __init__(self, function, maxsize):
+        u'''
+        :param function: The function to cache (arguments must be hashable).
+        :param maxsize: The maximum number of entries retained (0 disables
+                        caching).
+        :return: A new, empty cache.
+        '''
+        self.function = function
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._entries = {}
+        self._order = deque()  # keys, oldest first
+        self._lock = Lock()
+
+    def __call__(self, *args):
+        try:
+            value = self._entries[args]
+            self.hits += 1
+            return value
+        except KeyError:
+            value = self.function(*args)
+            with self._lock:
+                self.misses += 1
+                if not self.maxsize:
+                    return value
+                if args in self._entries:
+                    return self._entries[args]
+                self._entries[args] = value
+                self._order.append(args)
+                self.__evict()
+                return value
+
+    def __evict(self):
+        # lock already held
+        while len(self._order) > self.maxsize:
+            del self._entries[self._order.popleft()]
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        u'''
+        :param maxsize: The new maximum number of entries (older entries are
+                        discarded if necessary).
+        '''
+        with self._lock:
+            self.maxsize = maxsize
+            self.__evict()
+
+    def clear(self):
+        u'''
+        Discard all entries (the counters are retained).
+        '''
+        with self._lock:
+            self._entries = {}
+            self._order.clear()
+
+    def items(self):
+        u'''
+        :return: A list of the (arguments, value) pairs currently cached.
+        '''
+        with self._lock:
+            return list(self._entries.items())
+
+    def info(self):
+        u'''
+        :return: Statistics, as a `CacheInfo` named tuple.
+        '''
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+
+class LazyInstance(object):
+    u'''
+    A stand-in for a value that is expensive to construct (eg a default
+    instance created at module level).  The value is built on first use and
+    all attribute access is then delegated to it.
+    '''
+
+    def __init__(self, builder):
+        u'''
+        :param builder: A thunk to evaluate to generate the value.
+        :return: A proxy for the (not yet constructed) value.
+        '''
+        self._builder = builder
+        self._value = None
+        self._lock = Lock()
+
+    @property
+    def built(self):
+        u'''
+        :return: Has the value been constructed?
+        '''
+        return self._value is not None
+
+    @property
+    def value(self):
+        u'''
+        :return: The value (constructed, once only, if necessary).
+        '''
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._builder()
+                value = self._value
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.value, name)
+
+    def __repr__(self):
+        return u'{0}({1!r})'.format(self.__class__.__name__, self._value if self.built else self._builder)
+
+
+class Log(object):
+    u'''
+    An enabled debug log.  Messages are `{0}`-style templates, formatted only
+    here, and sent to the `logging` logger at DEBUG level (and printed to
+    stdout if `echo`).
+    '''
+
+    __slots__ = (u'logger', u'name', u'echo')
+
+    def __init__(self, logger, name, echo):
+        u'''
+        :param logger: The `logging.Logger` to use.
+        :param name: The prefix for messages printed to stdout.
+        :param echo: True to print messages to stdout.
+        '''
+        self.logger = logger
+        self.name = name
+        self.echo = echo
+
+    def __nonzero__(self):
+        return True
+
+    def __call__(self, template, *args, **kargs):
+        u'''
         :param template: A string that can contain embedded {0}-style
                          formatting.
         :param args: Format arguments.
         :param kargs: Named format arguments.
         '''
-        print u'%s: %s' % (self.__class__.__name__, template.format(*args, **kargs))
+        message = template.format(*args, **kargs)
+        if self.echo:
+            print u'%s: %s' % (self.name, message)
+        self.logger.debug(message)
 
-    def _drop(self, template, *args, **kargs):
-        u'''
-        A null logger that discards its arguments.
 
-        :param template: Unused.
-        :param args: Unused.
-        :param kargs: Unused.
-        '''
+class DropLog(object):
+    u'''
+    A disabled debug log, which discards its arguments.  It is false, so that
+    callers can skip building expensive arguments with `if log: log(...)`.
+    '''
+
+    __slots__ = ()
+
+    def __nonzero__(self):
+        return False
+
+    def __call__(self, template, *args, **kargs):
         pass
 
+DROP_LOG = DropLog()
+
+
+class DebugLog(object):
+    u'''
+    Base class supporting a debug log, sent to the `logging` logger named
+    after the class (eg `simpledate.SimpleDate`).  So logging can be enabled
+    at runtime by setting the level of that logger (or `simpledate`) to
+    DEBUG; passing `debug=True` also enables it, printing to stdout.
+    '''
+
+    __LOGGERS = {}  # class -> logger
+
+    def _get_log(self, debug):
+        u'''
+        :param debug: True to enable logging (printing to stdout).
+        :return: A `Log` if logging is enabled, otherwise `DROP_LOG`.
+        '''
+        cls = self.__class__
+        logger = DebugLog.__LOGGERS.get(cls)
+        if logger is None:
+            logger = DebugLog.__LOGGERS.setdefault(cls, getLogger(u'%s.%s' % (cls.__module__, cls.__name__)))
+        if debug or logger.isEnabledFor(DEBUG):
+            return Log(logger, cls.__name__, debug)
+        return DROP_LOG
+
 
 class HashableDict(dict):
     # http://stackoverflow.com/questions/1151658/python-hashable-dicts
@@ -188,3 +514,62 @@ def always_tuple(value, none=()):
         return (value,)
 
 
+
+
+ZERO = dt.timedelta(0)
+
+class NamedOffset(dt.tzinfo):
+    u'''
+    A timezone with a fixed offset and name (like `datetime.timezone`,
+    which is not available in Python 2).  `localize` and `normalize` are
+    provided, as for pytz timezones.
+    '''
+
+    __slots__ = (u'__offset', u'__name')
+
+    def __init__(self, offset, name):
+        u'''
+        :param offset: The offset from UTC (timedelta instance).
+        :param name: The name of the timezone (`None` if it has no name, when
+                     it is displayed as the offset, eg UTC+01:00).
+        '''
+        self.__offset = offset
+        # datetime requires str (not unicode) from tzname()
+        self.__name = name.encode(u'utf8') if isinstance(name, unicode) else name
+
+    def __getinitargs__(self):
+        return self.__offset, self.__name
+
+    def utcoffset(self, datetime):
+        return self.__offset
+
+    def dst(self, datetime):
+        return ZERO
+
+    def tzname(self, datetime):
+        return self.__name
+
+    def fromutc(self, datetime):
+        return (datetime + self.__offset).replace(tzinfo=self)
+
+    def localize(self, datetime, is_dst=False):
+        if datetime.tzinfo is not None:
+            raise ValueError(u'Not naive datetime (tzinfo is already set)')
+        return datetime.replace(tzinfo=self)
+
+    def normalize(self, datetime, is_dst=False):
+        if datetime.tzinfo is None:
+            raise ValueError(u'Naive time - no tzinfo set')
+        return datetime.astimezone(self)
+
+    def __str__(self):
+        return unicode(self).encode(u'utf8')
+
+    def __unicode__(self):
+        if self.__name is not None:
+            return self.__name.decode(u'utf8')
+        minutes = (self.__offset.days * 86400 + self.__offset.seconds) // 60
+        return u'UTC{0}{1:02}:{2:02}'.format(u'-' if minutes < 0 else u'+', abs(minutes) // 60, abs(minutes) % 60)
+
+    def __repr__(self):
+        return u'{0}({1!r}, {2!r})'.format(self.__class__.__name__, self.__offset, unicode(self))